@@ -0,0 +1,63 @@
+import csv
+import io
+from typing import Any, Callable, Iterable
+
+# local imports
+from app.blogs.schemas import Blog
+from app.core.responses import dumps
+
+CSV_COLUMNS = (
+    "id",
+    "title",
+    "slug",
+    "content",
+    "created_at",
+    "updated_at",
+    "comment_count",
+    "author_id",
+    "author_username",
+)
+
+
+def _csv(rows: Iterable[Iterable[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+CSV_HEADER = _csv([CSV_COLUMNS])
+
+
+def to_ndjson(blogs: list[Blog]) -> bytes:
+    """
+    The blogs as newline delimited JSON, one blog per line in the shape the
+    API returns it.
+    """
+    return b"".join(dumps(blog) + b"\n" for blog in blogs)
+
+
+def to_csv(blogs: list[Blog]) -> bytes:
+    """
+    The blogs as CSV rows of `CSV_COLUMNS`, without the header.
+    """
+    return _csv(
+        (
+            blog.id,
+            blog.title,
+            blog.slug,
+            blog.content,
+            blog.created_at.isoformat(),
+            blog.updated_at.isoformat(),
+            blog.comment_count,
+            blog.author_id,
+            blog.author.username,
+        )
+        for blog in blogs
+    )
+
+
+# format -> (media type, what the export starts with, serializer of a batch)
+EXPORT_FORMATS: dict[str, tuple[str, bytes, Callable[[list[Blog]], bytes]]] = {
+    "ndjson": ("application/x-ndjson", b"", to_ndjson),
+    "csv": ("text/csv; charset=utf-8", CSV_HEADER, to_csv),
+}
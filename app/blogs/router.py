@@ -1,23 +1,62 @@
-from fastapi import APIRouter, Depends, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.responses import StreamingResponse
 
 # local imports
 from app.blogs.authorizer import author_only
-from app.blogs.schemas import BlogCreate, BlogUpdate
+from app.blogs.helpers import EXPORT_FORMATS
+from app.blogs.schemas import BlogBulkCreate, BlogCreate, BlogUpdate
 from app.blogs.services import BlogService
+from app.config import DB_JSON_RESPONSES
 from app.core.auth import get_current_user
+from app.core.response_cache import cached_get
+from app.core.responses import FastJSONResponse
+from app.db import get_unit_of_work
 
-router = APIRouter()
+router = APIRouter(
+    dependencies=[Depends(get_unit_of_work)], default_response_class=FastJSONResponse
+)
 
 
 @router.get("/")
-async def get_blogs(skip: int = 0, limit: int = 2):
+async def get_blogs(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(2, ge=1, le=100),
+    cursor: Optional[str] = None,
+    with_count: Optional[bool] = None,
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+):
     """
     Get all blogs.
+    Pass the `next_cursor`/`previous_cursor` of a page as `cursor` to move
+    through the blogs without OFFSET scans.
+    `view=summary` lists titles, excerpts and author usernames only and
+    `fields` picks the fields to return, e.g. `fields=id,title,slug`.
+    `ids` gets the blogs of a comma separated list of ids instead, in that
+    order, with one query.
     """
-    blogs = await BlogService.get_blogs_paginated(skip, limit)
-    return blogs
+
+    async def load():
+        if ids is not None:
+            return await BlogService.get_many(ids.split(","))
+
+        return await BlogService.get_blogs_paginated(
+            skip,
+            limit,
+            cursor,
+            with_count,
+            view=view,
+            fields=fields.split(",") if fields else None,
+            as_json=DB_JSON_RESPONSES,
+        )
+
+    return await cached_get(
+        request, lambda: BlogService.get_blogs_version(request.url.query), load
+    )
 
 
 @router.post("/")
@@ -30,17 +69,102 @@ async def create_blog_api(
             user_id=user.id,
             data=form_data,
         )
-        return JSONResponse(
-            status_code=status.HTTP_201_CREATED, content=jsonable_encoder(blog)
-        )
+        return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=blog)
     except ValueError as e:
-        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=e.args[0])
+        return FastJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content=e.args[0]
+        )
+
+
+@router.post("/bulk")
+async def bulk_create_blogs_api(
+    form_data: BlogBulkCreate,
+    user=Depends(get_current_user),
+):
+    """
+    Create up to `BULK_CREATE_MAX_ITEMS` blogs at once, e.g. to import them.
+    """
+    result = await BlogService.bulk_create(user_id=user.id, items=form_data.items)
+    return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=result)
+
+
+@router.get("/export")
+async def export_blogs(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    _=Depends(get_current_user),
+):
+    """
+    Export every blog, oldest first, as newline delimited JSON (a blog per
+    line) or CSV. The blogs are streamed in batches of `EXPORT_BATCH_SIZE`
+    as they are read, so an export of any size takes the same memory.
+    """
+    media_type, header, serialize = EXPORT_FORMATS[format]
+
+    async def stream():
+        if header:
+            yield header
+        async for blogs in BlogService.iter_blogs():
+            yield serialize(blogs)
+
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="blogs.{format}"'},
+    )
+
+
+@router.get("/search")
+async def search_blogs(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """
+    Search the titles and content of the blogs, best matches first.
+    `q` takes words, "quoted phrases", `or` and `-excluded` words. Pass the
+    `next_cursor` of a page as `cursor` for the next one.
+    """
+    return await cached_get(
+        request,
+        lambda: BlogService.get_blogs_version(request.url.query),
+        lambda: BlogService.search(q, limit, cursor),
+    )
+
+
+@router.get("/autocomplete")
+async def autocomplete_blogs(
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    The newest blogs whose title or slug starts with `prefix`, ignoring case,
+    for suggestions while typing. Writes made by other workers may take up
+    to `AUTOCOMPLETE_REBUILD_INTERVAL` seconds to show.
+    """
+    return FastJSONResponse(BlogService.autocomplete(prefix, limit))
+
+
+@router.get("/by-slug/{slug:path}")
+async def get_blog_by_slug(slug: str, request: Request):
+    """
+    Get a blog by its slug rather than its id, e.g. for public URLs.
+    """
+    blog_id = await BlogService.get_id_by_slug(slug)
+    return await cached_get(
+        request,
+        lambda: BlogService.get_blog_version(blog_id),
+        lambda: BlogService.get_by_id(blog_id),
+    )
 
 
 @router.get("/{blog_id}")
-async def get_blog(blog_id: str):
-    blog = await BlogService.get_by_id(blog_id)
-    return blog
+async def get_blog(blog_id: str, request: Request):
+    return await cached_get(
+        request,
+        lambda: BlogService.get_blog_version(blog_id),
+        lambda: BlogService.get_by_id(blog_id),
+    )
 
 
 @router.patch("/{blog_id}")
@@ -51,7 +175,7 @@ async def update_blog(
     __=Depends(author_only),
 ):
     blog = await BlogService.update(blog_id, form_data)
-    return blog
+    return FastJSONResponse(blog)
 
 
 @router.delete("/{blog_id}")
@@ -61,4 +185,4 @@ async def delete_blog(
     __=Depends(author_only),
 ):
     await BlogService.delete(blog_id)
-    return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, content={})
+    return FastJSONResponse(status_code=status.HTTP_204_NO_CONTENT, content={})
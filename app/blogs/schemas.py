@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional, Union
 
 from pydantic import BaseModel
 
@@ -12,6 +12,11 @@ class BlogCreate(BaseModel):
     content: str
 
 
+class Author(UserPublic):
+    blog_count: int = 0
+    comment_count: int = 0
+
+
 class Blog(BaseModel):
     id: str
     title: str
@@ -21,16 +26,82 @@ class Blog(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+    comment_count: int = 0
+
     author_id: str
-    author: UserPublic
+    author: Author
+
+
+class BlogSummary(BaseModel):
+    """
+    What a listing needs to show a blog, without its content.
+    """
+
+    id: str
+    title: str
+    slug: str
+    excerpt: str
+
+    created_at: datetime
+
+    comment_count: int = 0
+
+    author_username: str
+
+
+class BlogSearchResult(BlogSummary):
+    # the passages of the content matching the search as HTML: the content
+    # is escaped and the matching words are in <b></b>
+    headline: str
+    rank: float
+
+
+class PaginatedBlogSearchResponse(BaseModel):
+    results: list[BlogSearchResult]
+    next: Optional[str]
+    next_cursor: Optional[str] = None
+
+
+class BlogSuggestion(BaseModel):
+    id: str
+    title: str
+    slug: str
 
 
 class PaginatedBlogsResponse(BaseModel):
-    results: list[Blog]
-    count: int
+    # sparse fieldsets (`fields=`) come back as plain dicts; they are listed
+    # first, or the union would validate them into one of the models
+    results: Union[list[dict[str, Any]], list[Blog], list[BlogSummary]]
+    count: Optional[int]
     next: Optional[str]
     previous: Optional[str]
 
+    # opaque keyset cursors, see `BlogService.get_blogs_paginated`
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+
+
+class BlogMultiGetResponse(BaseModel):
+    # in the order they were asked for
+    results: list[Blog]
+    # the ids asked for which no blog has
+    missing: list[str]
+
+
+class BlogBulkCreate(BaseModel):
+    items: list[BlogCreate]
+
+
+class BlogBulkResult(BaseModel):
+    id: str
+    slug: str
+
+
+class BlogBulkCreateResponse(BaseModel):
+    created: int
+    # in the order of the items
+    results: list[BlogBulkResult]
+
 
 class BlogUpdate(BaseModel):
     title: Optional[str] = None
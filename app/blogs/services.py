@@ -1,267 +1,900 @@
+import time
 import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Union
+from urllib.parse import urlencode
 
-# psycopg2
-from psycopg2.errors import UniqueViolation
+from psycopg import AsyncCursor
 
 # local imports
-from app.blogs.schemas import Blog, BlogCreate, BlogUpdate, PaginatedBlogsResponse
-from app.core.exceptions import EntityNotFound
-from app.core.string import random_string, slugify
-from app.db import get_connection, release_connection
-from app.users.schemas import UserPublic
+from app.blogs.schemas import (
+    Author,
+    Blog,
+    BlogBulkCreateResponse,
+    BlogBulkResult,
+    BlogCreate,
+    BlogMultiGetResponse,
+    BlogSearchResult,
+    BlogSuggestion,
+    BlogSummary,
+    BlogUpdate,
+    PaginatedBlogSearchResponse,
+    PaginatedBlogsResponse,
+)
+from app.config import (
+    BULK_CREATE_MAX_ITEMS,
+    COMMENT_COUNTS_MAX_AGE,
+    EXPORT_BATCH_SIZE,
+    SEARCH_MAX_CANDIDATES,
+    SLUG_CACHE_SIZE,
+)
+from app.core.cache import LRUCache
+from app.core.counts import get_count
+from app.core.exceptions import BadRequest, EntityNotFound
+from app.core.mapper import RowMapper, json_build_object
+from app.core.pagination import (
+    NEXT,
+    PREVIOUS,
+    decode_cursor,
+    encode_cursor,
+    parse_number,
+    parse_timestamp,
+    parse_uuid,
+)
+from app.core.prefix_index import PrefixIndex
+from app.core.responses import RawJSON, json_array, json_object
+from app.core.statements import statements
+from app.core.string import make_excerpt, normalize_uuid, random_string, slugify
+from app.core.versions import (
+    BLOGS,
+    ResourceVersion,
+    blog_key,
+    bump_versions,
+    comments_key,
+    get_version,
+    user_key,
+)
+from app.db import after_commit, get_connection, get_own_connection, load, load_many
+
+VIEW_FULL = "full"
+VIEW_SUMMARY = "summary"
+
+# what a listing can be narrowed down to with `fields`
+LIST_FIELDS = {
+    "id": "blog.id",
+    "title": "blog.title",
+    "slug": "blog.slug",
+    "excerpt": "blog.excerpt",
+    "content": "blog.content",
+    "created_at": "blog.created_at",
+    "updated_at": "blog.updated_at",
+    "comment_count": "blog.comment_count",
+    "author_id": "blog.author_id",
+    "author_username": "author.username",
+}
+
+AUTHOR_ROW = RowMapper(
+    Author,
+    {
+        "id": "author.id",
+        "username": "author.username",
+        "created_at": "author.created_at",
+        "updated_at": "author.updated_at",
+        "blog_count": "author.blog_count",
+        "comment_count": "author.comment_count",
+    },
+)
+
+BLOG_ROW = RowMapper(
+    Blog,
+    {
+        "id": "blog.id",
+        "title": "blog.title",
+        "slug": "blog.slug",
+        "content": "blog.content",
+        "created_at": "blog.created_at",
+        "updated_at": "blog.updated_at",
+        "comment_count": "blog.comment_count",
+        "author_id": "blog.author_id",
+        "author": AUTHOR_ROW,
+    },
+)
+
+BLOG_SUMMARY_ROW = RowMapper(
+    BlogSummary, {name: LIST_FIELDS[name] for name in BlogSummary.model_fields}
+)
+
+# the query of `search`, in the same text search configuration as the
+# `search_vector` of blogs
+SEARCH_QUERY = "websearch_to_tsquery('english', %(q)s)"
+
+# what `search` shows of a result; `page` is the CTE of the results
+SEARCH_RESULT_ROW = RowMapper(
+    BlogSearchResult,
+    {
+        **BLOG_SUMMARY_ROW.json_fields,
+        # the content is HTML escaped first, so the <b></b> around the
+        # matching words are the only markup in the headline
+        "headline": (
+            "ts_headline('english', replace(replace(replace(replace("
+            "blog.content, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'),"
+            " '\"', '&quot;'),"
+            f" {SEARCH_QUERY}, 'MaxFragments=2, MinWords=10, MaxWords=30')"
+        ),
+        "rank": "page.rank",
+    },
+)
+
+BLOGS_BY_ID = statements.register(
+    "blogs_by_id",
+    f"""
+    SELECT
+        {BLOG_ROW.columns}
+    FROM
+        blogs blog
+    JOIN
+        users author ON blog.author_id = author.id
+    WHERE
+        blog.id = ANY(%s::uuid[])
+    """,
+)
+
+# most blogs `get_many` reads at once
+MULTI_GET_MAX_IDS = 100
+
+BLOG_AUTHOR_ID = statements.register(
+    "blog_author_id", "SELECT author_id FROM blogs WHERE id = %s"
+)
+
+BLOG_ID_BY_SLUG = statements.register(
+    "blog_id_by_slug", "SELECT id FROM blogs WHERE slug = %s"
+)
+
+# how many slugs are tried for a new blog before giving up
+SLUG_ATTEMPTS = 5
+
+# blog ids by slug; entries are dropped by `BlogService.delete`
+slug_cache: LRUCache[str] = LRUCache(max_size=SLUG_CACHE_SIZE)
+
+# the titles and slugs of the blogs, for autocomplete; (id, title, slug) by id
+title_index: PrefixIndex[tuple[str, str, str]] = PrefixIndex(
+    texts=lambda blog: blog[1:]
+)
+
+
+def make_slug(title: str) -> str:
+    return slugify(title) + "-" + random_string(6)
+
+
+def index_title(blog_id: str, title: str, slug: str, created_at: datetime) -> None:
+    """
+    Put the blog in the autocomplete index once the transaction is committed.
+    """
+    after_commit(
+        lambda: title_index.set(blog_id, (blog_id, title, slug), created_at.timestamp())
+    )
 
 
 class BlogService:
     @staticmethod
     async def create(user_id: str, data: BlogCreate) -> Blog:
-        conn = get_connection()
-        try:
-            blog_id = str(uuid.uuid4())
-            slug = slugify(data.title) + "-" + random_string(6)
+        """
+        Create a blog of `user_id`. Its slug is the slugified title and a
+        random suffix; a slug already taken is retried with another suffix.
+        """
+        blog_id = str(uuid.uuid4())
 
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO blogs
-                    (id, title, slug, content, author_id)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (
-                        blog_id,
-                        data.title,
-                        slug,
-                        data.content,
-                        user_id,
-                    ),
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                for _ in range(SLUG_ATTEMPTS):
+                    slug = make_slug(data.title)
+                    await cur.execute(
+                        f"""
+                        WITH blog AS (
+                            INSERT INTO blogs
+                            (id, title, slug, content, excerpt, author_id)
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                            ON CONFLICT (slug) DO NOTHING
+                            RETURNING *
+                        ), counter AS (
+                            INSERT INTO entity_counts (name, value)
+                            SELECT 'blogs', COUNT(*) FROM blog
+                            ON CONFLICT (name)
+                            DO UPDATE SET value = entity_counts.value + EXCLUDED.value
+                        ), author AS (
+                            UPDATE users
+                            SET blog_count = users.blog_count + 1
+                            FROM blog
+                            WHERE users.id = blog.author_id
+                            RETURNING users.*
+                        )
+                        SELECT
+                            {BLOG_ROW.columns}
+                        FROM
+                            blog
+                        JOIN
+                            author ON blog.author_id = author.id
+                        """,
+                        (
+                            blog_id,
+                            data.title,
+                            slug,
+                            data.content,
+                            make_excerpt(data.content),
+                            user_id,
+                        ),
+                    )
+                    row = await cur.fetchone()
+                    if row is not None:
+                        break
+                else:
+                    raise ValueError(
+                        {"non_field_errors": ["Could not give the blog a unique slug."]}
+                    )
+                await bump_versions(
+                    cur,
+                    [
+                        BLOGS,
+                        blog_key(blog_id),
+                        comments_key(blog_id),
+                        user_key(user_id),
+                    ],
                 )
-                conn.commit()
-            return await BlogService.get_by_id(blog_id)
-        except UniqueViolation as e:
-            conn.rollback()
-            raise e
-        finally:
-            release_connection(conn)
+
+                blog = BLOG_ROW.build(row)
+                index_title(blog.id, blog.title, blog.slug, blog.created_at)
+                after_commit(lambda: slug_cache.set(blog.slug, blog.id))
+                return blog
 
     @staticmethod
-    async def get_by_id(blog_id: str) -> Blog:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
+    async def bulk_create(
+        user_id: str, items: list[BlogCreate]
+    ) -> BlogBulkCreateResponse:
+        """
+        Create many blogs of one author at once, e.g. to import them, in one
+        transaction: the rows are sent with COPY and the counters and
+        versions they change are updated once for the whole batch.
+
+        The blogs are dated a microsecond apart in the order of `items`, so
+        they list in that order, newest last.
+        """
+        if len(items) > BULK_CREATE_MAX_ITEMS:
+            raise BadRequest(
+                name="Blogs",
+                message=(
+                    f"At most {BULK_CREATE_MAX_ITEMS} blogs can be created at once."
+                ),
+            )
+        if not items:
+            return BlogBulkCreateResponse(created=0, results=[])
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT LOCALTIMESTAMP")
+                [(now,)] = await cur.fetchall()
+
+                slugs = await BlogService._get_bulk_slugs(
+                    cur, [item.title for item in items]
+                )
+
+                results = []
+                async with cur.copy(
                     """
-                    SELECT
-                        blogs.id,
-                        blogs.title,
-                        blogs.slug,
-                        blogs.content,
-                        blogs.created_at,
-                        blogs.updated_at,
-                        blogs.author_id,
-                        users.id,
-                        users.username,
-                        users.created_at,
-                        users.updated_at
-                    FROM
-                        blogs
-                    JOIN
-                        users ON blogs.author_id = users.id
-                    WHERE
-                        blogs.id = %s
+                    COPY blogs (
+                        id, title, slug, content, excerpt, author_id,
+                        created_at, updated_at
+                    )
+                    FROM STDIN
+                    """
+                ) as copy:
+                    for index, item in enumerate(items):
+                        blog_id = str(uuid.uuid4())
+                        slug = slugs[index]
+                        created_at = now + timedelta(microseconds=index)
+                        await copy.write_row(
+                            (
+                                blog_id,
+                                item.title,
+                                slug,
+                                item.content,
+                                make_excerpt(item.content),
+                                user_id,
+                                created_at,
+                                created_at,
+                            )
+                        )
+                        results.append(BlogBulkResult(id=blog_id, slug=slug))
+                        index_title(blog_id, item.title, slug, created_at)
+
+                await cur.execute(
+                    """
+                    WITH counter AS (
+                        INSERT INTO entity_counts (name, value)
+                        VALUES ('blogs', %(created)s)
+                        ON CONFLICT (name)
+                        DO UPDATE SET value = entity_counts.value + EXCLUDED.value
+                    )
+                    UPDATE users
+                    SET blog_count = users.blog_count + %(created)s
+                    WHERE id = %(user_id)s
                     """,
-                    (blog_id,),
+                    {"created": len(results), "user_id": user_id},
+                )
+                await bump_versions(
+                    cur,
+                    [BLOGS, user_key(user_id)]
+                    + [blog_key(result.id) for result in results]
+                    + [comments_key(result.id) for result in results],
                 )
-                blog = cur.fetchone()
+
+        return BlogBulkCreateResponse(created=len(results), results=results)
+
+    @staticmethod
+    async def _get_bulk_slugs(cur: AsyncCursor, titles: list[str]) -> list[str]:
+        """
+        A slug for each of `titles`, unlike each other and those of the blogs
+        already stored, as COPY can't skip the rows whose slug is taken.
+        """
+        slugs: list[Optional[str]] = [None] * len(titles)
+        given: set[str] = set()
+        pending = list(range(len(titles)))
+        for _ in range(SLUG_ATTEMPTS):
+            candidates: dict[str, int] = {}
+            for index in pending:
+                slug = make_slug(titles[index])
+                if slug not in candidates and slug not in given:
+                    candidates[slug] = index
+
+            await cur.execute(
+                "SELECT slug FROM blogs WHERE slug = ANY(%s)", (list(candidates),)
+            )
+            stored = {slug for (slug,) in await cur.fetchall()}
+            for slug, index in candidates.items():
+                if slug not in stored:
+                    slugs[index] = slug
+                    given.add(slug)
+
+            pending = [index for index, slug in enumerate(slugs) if slug is None]
+            if not pending:
+                return [slug for slug in slugs if slug is not None]
+
+        raise BadRequest(
+            name="Blogs", message="Could not give every blog a unique slug."
+        )
+
+    @staticmethod
+    async def get_blog_version(blog_id: str) -> ResourceVersion:
+        """
+        The version of `get_by_id(blog_id)`, read without touching its content.
+        """
+        key = normalize_uuid(blog_id)
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                blog = None
+                if key is not None:
+                    await BLOG_AUTHOR_ID.execute(cur, (key,))
+                    blog = await cur.fetchone()
                 if blog is None:
                     raise EntityNotFound(
                         name="Blogs", message=f"No blog can be found with id: {blog_id}"
                     )
 
-                return Blog(
-                    id=blog[0],
-                    title=blog[1],
-                    slug=blog[2],
-                    content=blog[3],
-                    created_at=blog[4],
-                    updated_at=blog[5],
-                    author_id=blog[6],
-                    author=UserPublic(
-                        id=blog[7],
-                        username=blog[8],
-                        created_at=blog[9],
-                        updated_at=blog[10],
-                    ),
-                )
+                return await get_version(cur, [blog_key(key), user_key(blog[0])])
 
-        except UniqueViolation as e:
-            conn.rollback()
-            raise e
-        finally:
-            release_connection(conn)
+    @staticmethod
+    async def get_blogs_version(variant: str) -> ResourceVersion:
+        """
+        The version of a page of the blog listing, `variant` being its query.
+        """
+        # comment writes don't bump BLOGS, so the version moves on every
+        # COMMENT_COUNTS_MAX_AGE seconds to bring their counts in
+        if COMMENT_COUNTS_MAX_AGE > 0:
+            variant += f"\0{int(time.time() // COMMENT_COUNTS_MAX_AGE)}"
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                return await get_version(cur, [BLOGS], variant)
 
     @staticmethod
-    async def get_blogs() -> list[Blog]:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
+    async def get_by_id(blog_id: str) -> Blog:
+        """
+        The blog of `blog_id`. Concurrent lookups in a unit of work are read
+        together, see `get_by_ids`.
+        """
+        key = normalize_uuid(blog_id)
+        blog = await load(BlogService.get_by_ids, key) if key else None
+        if blog is None:
+            raise EntityNotFound(
+                name="Blogs", message=f"No blog can be found with id: {blog_id}"
+            )
+
+        return blog
+
+    @staticmethod
+    async def get_id_by_slug(slug: str) -> str:
+        """
+        The id of the blog of `slug`, from `slug_cache` or with one probe of
+        the unique index on slugs.
+        """
+        blog_id = slug_cache.get(slug)
+        if blog_id is not None:
+            return blog_id
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await BLOG_ID_BY_SLUG.execute(cur, (slug,))
+                blog = await cur.fetchone()
+        if blog is None:
+            raise EntityNotFound(
+                name="Blogs", message=f"No blog can be found with slug: {slug}"
+            )
+
+        slug_cache.set(slug, blog[0])
+        return blog[0]
+
+    @staticmethod
+    async def get_by_ids(blog_ids: list[str]) -> dict[str, Blog]:
+        """
+        The blogs of `blog_ids` which exist, by id, read with one query. The
+        ids have to be in their canonical form (see `normalize_uuid`).
+        """
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await BLOGS_BY_ID.execute(cur, (blog_ids,))
+                blogs = await cur.fetchall()
+
+        return {blog.id: blog for blog in BLOG_ROW.build_all(blogs)}
+
+    @staticmethod
+    async def get_many(blog_ids: list[str]) -> BlogMultiGetResponse:
+        """
+        The blogs of `blog_ids` in that order, read with one query. The ids
+        of blogs which don't exist are listed in `missing`.
+        """
+        if len(blog_ids) > MULTI_GET_MAX_IDS:
+            raise BadRequest(
+                name="Blogs",
+                message=f"At most {MULTI_GET_MAX_IDS} blogs can be read at once.",
+            )
+
+        keys = [normalize_uuid(blog_id) for blog_id in blog_ids]
+        found = [key for key in keys if key]
+        blogs = dict(zip(found, await load_many(BlogService.get_by_ids, found)))
+
+        results, missing = [], []
+        for blog_id, key in zip(blog_ids, keys):
+            blog = blogs.get(key) if key else None
+            if blog is None:
+                missing.append(blog_id)
+            else:
+                results.append(blog)
+
+        return BlogMultiGetResponse(results=results, missing=missing)
+
+    @staticmethod
+    async def iter_blogs(
+        batch_size: int = EXPORT_BATCH_SIZE,
+    ) -> AsyncIterator[list[Blog]]:
+        """
+        Every blog, oldest first, in batches of `batch_size` fetched from a
+        server side cursor, so that reading all of them takes as much memory
+        as one batch whatever the size of the table.
+
+        It reads on a connection of its own, as it is meant to be consumed by
+        a streamed response, after the unit of work of the request is over.
+        """
+        async with get_own_connection() as conn:
+            async with conn.cursor(name="blog_export") as cur:
+                await cur.execute(
+                    f"""
                     SELECT
-                        blog.id,
-                        blog.title,
-                        blog.slug,
-                        blog.content,
-                        blog.created_at,
-                        blog.updated_at,
-                        blog.author_id,
-                        author.id,
-                        author.username,
-                        author.created_at,
-                        author.updated_at
+                        {BLOG_ROW.columns}
                     FROM
                         blogs blog
                     JOIN
                         users author ON blog.author_id = author.id
+                    ORDER BY
+                        blog.created_at, blog.id
                     """
                 )
-                blogs = cur.fetchall()
-
-                return [
-                    Blog(
-                        id=blog[0],
-                        title=blog[1],
-                        slug=blog[2],
-                        content=blog[3],
-                        created_at=blog[4],
-                        updated_at=blog[5],
-                        author_id=blog[6],
-                        author=UserPublic(
-                            id=blog[7],
-                            username=blog[8],
-                            created_at=blog[9],
-                            updated_at=blog[10],
-                        ),
-                    )
-                    for blog in blogs
-                ]
-
-        finally:
-            release_connection(conn)
+                while rows := await cur.fetchmany(batch_size):
+                    yield BLOG_ROW.build_all(rows)
 
     @staticmethod
-    async def get_blogs_paginated(skip: int, limit: int = 20) -> list[Blog]:
-        conn = get_connection()
-        try:
-            offset = skip * limit
-            with conn.cursor() as cur:
-                cur.execute(
+    async def get_blogs_paginated(
+        skip: int = 0,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        with_count: Optional[bool] = None,
+        view: str = VIEW_FULL,
+        fields: Optional[list[str]] = None,
+        as_json: bool = False,
+    ) -> Union[PaginatedBlogsResponse, RawJSON]:
+        """
+        Page through the blogs, newest first.
+
+        A page is addressed either by `skip` (OFFSET based) or by an opaque
+        `cursor` taken from a previous response. Cursors seek on the
+        (created_at, id) index, so a deep page costs the same as the first
+        one. The total count is only reported when asked for, which by
+        default is only in `skip` mode, and is read as configured by
+        BLOG_COUNT_MODE (see `app.core.counts`).
+
+        `view="summary"` lists `BlogSummary`s and `fields` narrows the blogs
+        down to the given `LIST_FIELDS` as dicts. Both only select the
+        columns they return, so the content is never read from the table.
+
+        With `as_json` the JSON of each blog is built by Postgres and the
+        page comes back as the same response, already serialized.
+        """
+        if fields:
+            unknown = set(fields) - LIST_FIELDS.keys()
+            if unknown:
+                raise BadRequest(
+                    name="Blogs",
+                    message=f"Unknown fields: {', '.join(sorted(unknown))}.",
+                )
+            fields = list(dict.fromkeys(fields))
+            # the cursor is made from the first two columns
+            expressions = ["blog.id", "blog.created_at"] + [
+                LIST_FIELDS[name] for name in fields
+            ]
+            json = json_build_object({name: LIST_FIELDS[name] for name in fields})
+
+            def build(row):
+                return dict(zip(fields, row[2:]))
+
+        elif view in (VIEW_FULL, VIEW_SUMMARY):
+            mapper = BLOG_SUMMARY_ROW if view == VIEW_SUMMARY else BLOG_ROW
+            expressions = list(mapper.expressions)
+            json = mapper.json
+            build = mapper.build
+        else:
+            raise BadRequest(name="Blogs", message=f"Unknown view: {view}.")
+
+        join = (
+            "JOIN users author ON blog.author_id = author.id"
+            if any(expression.startswith("author.") for expression in expressions)
+            else ""
+        )
+        if as_json:
+            expressions = ["blog.id", "blog.created_at", f"{json}::text"]
+        id_index = expressions.index("blog.id")
+        created_at_index = expressions.index("blog.created_at")
+        projection = ",\n".join(expressions)
+
+        if with_count is None:
+            with_count = cursor is None
+
+        direction: Optional[str] = NEXT
+        if cursor is not None:
+            position = decode_cursor(cursor, c=parse_timestamp, i=parse_uuid)
+            direction = position.get("d")
+            if direction not in (NEXT, PREVIOUS) or not {"c", "i"} <= position.keys():
+                raise BadRequest(name="Pagination", message="Invalid cursor.")
+
+            operator, order = ("<", "DESC") if direction == NEXT else (">", "ASC")
+            seek = f"""
+                    WHERE
+                        (blog.created_at, blog.id) {operator} (%s::timestamp, %s::uuid)
+                    ORDER BY blog.created_at {order}, blog.id {order}
+                    LIMIT %s
                     """
-                    SELECT
-                        blog.id,
-                        blog.title,
-                        blog.slug,
-                        blog.content,
-                        blog.created_at,
-                        blog.updated_at,
-                        blog.author_id,
-                        author.id,
-                        author.username,
-                        author.created_at,
-                        author.updated_at
+            params: tuple = (position["c"], position["i"], limit + 1)
+        else:
+            seek = """
+                    ORDER BY blog.created_at DESC, blog.id DESC
+                    LIMIT %s
+                    OFFSET %s
+                    """
+            params = (limit + 1, skip * limit)
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    SELECT {projection}
                     FROM
                         blogs blog
+                    {join}
+                    """
+                    + seek,
+                    params,
+                )
+                blogs = await cur.fetchall()
+
+                total_count = None
+                if with_count:
+                    total_count = await get_count(cur, "blogs")
+
+        # one extra row is fetched to know whether there is a further page
+        has_more = len(blogs) > limit
+        blogs = blogs[:limit]
+        if direction == PREVIOUS:
+            blogs.reverse()
+
+        if cursor is None:
+            has_next, has_previous = has_more, skip > 0
+        elif direction == NEXT:
+            has_next, has_previous = has_more, True
+        else:
+            has_next, has_previous = True, has_more
+
+        # the ends of the page; an empty page of a cursor keeps its position
+        ends = None
+        if blogs:
+            ends = (
+                (blogs[0][created_at_index], blogs[0][id_index]),
+                (blogs[-1][created_at_index], blogs[-1][id_index]),
+            )
+        elif cursor is not None:
+            ends = ((position["c"], position["i"]),) * 2
+
+        next_cursor = previous_cursor = None
+        if ends is not None:
+            first, last = ends
+            if has_next:
+                next_cursor = encode_cursor(d=NEXT, c=last[0], i=last[1])
+            if has_previous:
+                previous_cursor = encode_cursor(d=PREVIOUS, c=first[0], i=first[1])
+
+        base_url = "/api/blogs/"
+        query = f"&limit={limit}"
+        if fields:
+            query += f"&fields={','.join(fields)}"
+        elif view != VIEW_FULL:
+            query += f"&view={view}"
+        if cursor is None:
+            next_page = base_url + f"?skip={skip + 1}{query}" if has_next else None
+            prev_page = (
+                base_url + f"?skip={max(skip - 1, 0)}{query}" if has_previous else None
+            )
+        else:
+            next_page = (
+                base_url + f"?cursor={next_cursor}{query}" if next_cursor else None
+            )
+            prev_page = (
+                base_url + f"?cursor={previous_cursor}{query}"
+                if previous_cursor
+                else None
+            )
+
+        if as_json:
+            # in the order of the fields of PaginatedBlogsResponse
+            return json_object(
+                {
+                    "results": json_array(blog[2] for blog in blogs),
+                    "count": total_count,
+                    "next": next_page,
+                    "previous": prev_page,
+                    "next_cursor": next_cursor,
+                    "previous_cursor": previous_cursor,
+                }
+            )
+
+        return PaginatedBlogsResponse(
+            count=total_count,
+            next=next_page,
+            previous=prev_page,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+            results=[build(blog) for blog in blogs],
+        )
+
+    @staticmethod
+    async def search(
+        q: str, limit: int = 20, cursor: Optional[str] = None
+    ) -> PaginatedBlogSearchResponse:
+        """
+        The blogs matching the web search style query `q` (words, "quoted
+        phrases", `or` and `-excluded` words), best first.
+
+        Matches are found with the GIN index on `search_vector`, a title
+        match counting for more than one in the content, and ranked with
+        ts_rank_cd. Ranking reads every match, so only the newest
+        SEARCH_MAX_CANDIDATES of them are ranked, which bounds the cost of
+        queries matching a large part of the blogs. Pages are keyset paged
+        on (rank, id) with the opaque `cursor` of the previous page, and the
+        headlines, which need the content, are only made for the rows of the
+        page.
+        """
+        seek = ""
+        params: dict = {
+            "q": q,
+            "limit": limit + 1,
+            "candidates": SEARCH_MAX_CANDIDATES,
+        }
+        if cursor is not None:
+            position = decode_cursor(cursor, r=parse_number, i=parse_uuid)
+            if not {"r", "i"} <= position.keys():
+                raise BadRequest(name="Pagination", message="Invalid cursor.")
+
+            seek = "WHERE (match.rank, match.id) < (%(rank)s::real, %(id)s::uuid)"
+            params.update(rank=position["r"], id=position["i"])
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                # the query is written out in full rather than in a CTE, so the
+                # planner knows how common its words are: a word found in most
+                # blogs reads the newest of them from idx_blogs_created_at_id,
+                # a rare one goes through the GIN index. For the same reason
+                # it is never prepared, which could leave it with one plan for
+                # all searches.
+                await cur.execute(
+                    f"""
+                    WITH page AS (
+                        SELECT match.id, match.rank
+                        FROM (
+                            SELECT
+                                candidate.id,
+                                ts_rank_cd(candidate.search_vector, {SEARCH_QUERY})
+                                    AS rank
+                            FROM (
+                                SELECT blog.id, blog.search_vector
+                                FROM blogs blog
+                                WHERE blog.search_vector @@ {SEARCH_QUERY}
+                                ORDER BY blog.created_at DESC, blog.id DESC
+                                LIMIT %(candidates)s
+                            ) candidate
+                        ) match
+                        {seek}
+                        ORDER BY match.rank DESC, match.id DESC
+                        LIMIT %(limit)s
+                    )
+                    SELECT
+                        {SEARCH_RESULT_ROW.columns}
+                    FROM
+                        page
                     JOIN
-                        users author on blog.author_id = author.id
-                    ORDER BY blog.created_at DESC
-                    LIMIT %s
-                    OFFSET %s;
+                        blogs blog ON blog.id = page.id
+                    JOIN
+                        users author ON blog.author_id = author.id
+                    ORDER BY page.rank DESC, page.id DESC
                     """,
-                    (
-                        limit,
-                        offset,
-                    ),
+                    params,
+                    prepare=False,
                 )
-                blogs = cur.fetchall()
+                rows = await cur.fetchall()
 
-                cur.execute("SELECT COUNT(*) from blogs")
-                total_count = cur.fetchone()[0]
+        # one extra row is fetched to know whether there is a further page
+        results = SEARCH_RESULT_ROW.build_all(rows[:limit])
+        next_cursor = next_page = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(r=results[-1].rank, i=results[-1].id)
+            next_page = "/api/blogs/search?" + urlencode(
+                {"q": q, "limit": limit, "cursor": next_cursor}
+            )
 
-                base_url = "/blogs/"
-                next_page = (
-                    base_url + f"?skip={skip + 1}&limit={limit}"
-                    if (skip + 1) * limit < total_count
-                    else None
-                )
-                prev_page = (
-                    base_url + f"?skip={max(skip - 1, 0)}&limit={limit}"
-                    if skip > 0
-                    else None
-                )
+        return PaginatedBlogSearchResponse(
+            results=results, next=next_page, next_cursor=next_cursor
+        )
 
-                return PaginatedBlogsResponse(
-                    count=total_count,
-                    next=next_page,
-                    previous=prev_page,
-                    results=[
-                        Blog(
-                            id=blog[0],
-                            title=blog[1],
-                            slug=blog[2],
-                            content=blog[3],
-                            created_at=blog[4],
-                            updated_at=blog[5],
-                            author_id=blog[6],
-                            author=UserPublic(
-                                id=blog[7],
-                                username=blog[8],
-                                created_at=blog[9],
-                                updated_at=blog[10],
-                            ),
-                        )
-                        for blog in blogs
-                    ],
-                )
-        finally:
-            release_connection(conn)
+    @staticmethod
+    def autocomplete(prefix: str, limit: int) -> list[BlogSuggestion]:
+        """
+        The `limit` newest blogs whose title, or slug, starts with `prefix`,
+        answered from `title_index` without a query.
+        """
+        return [
+            BlogSuggestion(id=blog_id, title=title, slug=slug)
+            for blog_id, title, slug in title_index.search(prefix, limit)
+        ]
+
+    @staticmethod
+    async def rebuild_title_index() -> int:
+        """
+        Reload `title_index` from every blog, streamed with a server side
+        cursor. Returns how many blogs it holds.
+        """
+
+        async def load_titles():
+            async with get_connection() as conn:
+                async with conn.cursor(name="blog_titles") as cur:
+                    cur.itersize = 10000
+                    await cur.execute("SELECT id, title, slug, created_at FROM blogs")
+                    return [
+                        (blog_id, (blog_id, title, slug), created_at.timestamp())
+                        async for blog_id, title, slug, created_at in cur
+                    ]
+
+        await title_index.rebuild(load_titles)
+        return len(title_index)
 
     @staticmethod
     async def update(blog_id: str, blog_update: BlogUpdate) -> Blog:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE blogs
-                    SET
-                        title = %s,
-                        content = %s
-                    WHERE
-                        id = %s
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    WITH blog AS (
+                        UPDATE blogs
+                        SET
+                            title = COALESCE(%s, title),
+                            content = COALESCE(%s, content),
+                            excerpt = COALESCE(%s, excerpt)
+                        WHERE
+                            id = %s
+                        RETURNING *
+                    )
+                    SELECT
+                        {BLOG_ROW.columns}
+                    FROM
+                        blog
+                    JOIN
+                        users author ON blog.author_id = author.id
                     """,
                     (
                         blog_update.title,
                         blog_update.content,
+                        (
+                            make_excerpt(blog_update.content)
+                            if blog_update.content is not None
+                            else None
+                        ),
                         blog_id,
                     ),
                 )
-                conn.commit()
-                return await BlogService.get_by_id(blog_id)
+                row = await cur.fetchone()
+                if row is None:
+                    raise EntityNotFound(
+                        name="Blogs", message=f"No blog can be found with id: {blog_id}"
+                    )
+                blog = BLOG_ROW.build(row)
+                await bump_versions(cur, [BLOGS, blog_key(blog.id)])
 
-        finally:
-            release_connection(conn)
+                if blog_update.title is not None:
+                    index_title(blog.id, blog.title, blog.slug, blog.created_at)
+                return blog
 
     @staticmethod
     async def delete(blog_id: str) -> None:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """
-                    DELETE FROM blogs
+                    WITH blog AS (
+                        DELETE FROM blogs
+                        WHERE
+                            blogs.id = %s
+                        RETURNING id, author_id, slug
+                    ), counter AS (
+                        INSERT INTO entity_counts (name, value)
+                        SELECT 'blogs', -COUNT(*) FROM blog
+                        ON CONFLICT (name)
+                        DO UPDATE SET value = entity_counts.value + EXCLUDED.value
+                    ), lost AS (
+                        -- the blog, and its comments which go with it
+                        SELECT blog.author_id AS user_id, 1 AS blogs, 0 AS comments
+                        FROM blog
+                        UNION ALL
+                        SELECT comment.actor_id, 0, 1
+                        FROM comments comment
+                        JOIN blog ON comment.blog_id = blog.id
+                    )
+                    UPDATE users
+                    SET
+                        blog_count = users.blog_count - lost_by_user.blogs,
+                        comment_count = users.comment_count - lost_by_user.comments
+                    FROM (
+                        SELECT user_id, SUM(blogs) AS blogs, SUM(comments) AS comments
+                        FROM lost
+                        GROUP BY user_id
+                    ) lost_by_user
                     WHERE
-                        blogs.id = %s
+                        users.id = lost_by_user.user_id
+                    RETURNING users.id, (SELECT slug FROM blog)
                     """,
                     (blog_id,),
                 )
-                conn.commit()
-        finally:
-            release_connection(conn)
+                # every user whose counters changed, none if nothing was deleted
+                rows = await cur.fetchall()
+                user_ids = [row[0] for row in rows]
+                if user_ids:
+                    key = normalize_uuid(blog_id)
+                    await bump_versions(
+                        cur,
+                        [BLOGS, blog_key(key), comments_key(key)]
+                        + [user_key(user_id) for user_id in user_ids],
+                    )
+                    slug = rows[0][1]
+                    after_commit(lambda: title_index.remove(key))
+                    after_commit(lambda: slug_cache.invalidate(slug))
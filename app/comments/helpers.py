@@ -0,0 +1,15 @@
+import uuid
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def comment_path_label(created_at: datetime, comment_id: str) -> str:
+    """
+    The label of a comment in the paths of itself and its replies, as made
+    by `comment_path_label` in app/sql/create_comment_table.sql; keep them
+    in step.
+    """
+    micros = (created_at - EPOCH) // MICROSECOND
+    return f"{micros:014x}{uuid.UUID(comment_id).hex}"
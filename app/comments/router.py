@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request, status
 
 from app.comments.authorizer import author_only
 
 # local imports
-from app.comments.schemas import CommentCreate, CommentUpdate
+from app.comments.schemas import CommentBulkCreate, CommentCreate, CommentUpdate
 from app.comments.services import CommentService
+from app.config import DB_JSON_RESPONSES
 from app.core.auth import get_current_user
+from app.core.response_cache import cached_get
+from app.core.responses import FastJSONResponse
+from app.db import get_unit_of_work
 
-router = APIRouter()
+router = APIRouter(
+    dependencies=[Depends(get_unit_of_work)], default_response_class=FastJSONResponse
+)
 
 
 @router.post("/{blog_id}")
@@ -24,23 +30,98 @@ async def create_comment_api(
             actor_id=user.id,
             data=form_data,
         )
-        return JSONResponse(
-            status_code=status.HTTP_201_CREATED, content=jsonable_encoder(comment)
-        )
+        return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=comment)
     except ValueError as e:
-        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=e.args[0])
+        return FastJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content=e.args[0]
+        )
+
+
+@router.post("/{blog_id}/bulk")
+async def bulk_create_comments_api(
+    blog_id: str,
+    form_data: CommentBulkCreate,
+    user=Depends(get_current_user),
+):
+    """
+    Create up to `BULK_CREATE_MAX_ITEMS` comments on a blog at once, e.g. to
+    import them. Items reply to comments of the blog with `parent_id` or to
+    other items of the batch with `parent_ref`, the `ref` of that item.
+    """
+    result = await CommentService.bulk_create(
+        blog_id=blog_id, actor_id=user.id, items=form_data.items
+    )
+    return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=result)
 
 
 @router.get("/{comment_id}")
 async def get_comment(comment_id: str):
     comment = await CommentService.get_by_id(comment_id)
-    return comment
+    return FastJSONResponse(comment)
 
 
 @router.get("/blog/{blog_id}")
-async def get_comments_by_blog_id(blog_id: str):
-    comments = await CommentService.get_comments_by_blog_id(blog_id)
-    return comments
+async def get_comments_by_blog_id(
+    blog_id: str,
+    request: Request,
+    max_depth: Optional[int] = Query(None, ge=0),
+):
+    return await cached_get(
+        request,
+        lambda: CommentService.get_comments_version(blog_id, request.url.query),
+        lambda: CommentService.get_comments_by_blog_id(
+            blog_id, max_depth, as_json=DB_JSON_RESPONSES
+        ),
+    )
+
+
+@router.get("/{comment_id}/subtree")
+async def get_comment_subtree(
+    comment_id: str, max_depth: Optional[int] = Query(None, ge=0)
+):
+    comment = await CommentService.get_subtree(comment_id, max_depth)
+    return FastJSONResponse(comment)
+
+
+@router.get("/{comment_id}/ancestors")
+async def get_comment_ancestors(comment_id: str):
+    comments = await CommentService.get_ancestors(comment_id)
+    return FastJSONResponse(comments)
+
+
+@router.get("/blog/{blog_id}/threads")
+async def get_comment_threads(
+    blog_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    replies_limit: int = Query(3, ge=0, le=100),
+    max_depth: int = Query(3, ge=0, le=20),
+):
+    """
+    Get the top-level comments of a blog a page at a time, with the first
+    few replies under each.
+    """
+    threads = await CommentService.get_threads(
+        blog_id, limit, cursor, replies_limit, max_depth
+    )
+    return FastJSONResponse(threads)
+
+
+@router.get("/{comment_id}/replies")
+async def get_comment_replies(
+    comment_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    replies_limit: int = Query(3, ge=0, le=100),
+    max_depth: int = Query(3, ge=0, le=20),
+):
+    """
+    Load more replies of a comment, using its `replies_cursor`.
+    """
+    replies = await CommentService.get_replies(
+        comment_id, limit, cursor, replies_limit, max_depth
+    )
+    return FastJSONResponse(replies)
 
 
 @router.patch("/{comment_id}")
@@ -51,7 +132,7 @@ async def update_comment(
     __=Depends(author_only),
 ):
     comment = await CommentService.update(comment_id, form_data)
-    return comment
+    return FastJSONResponse(comment)
 
 
 @router.delete("/{comment_id}")
@@ -61,4 +142,4 @@ async def delete_comment(
     __=Depends(author_only),
 ):
     await CommentService.delete(comment_id)
-    return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, content={})
+    return FastJSONResponse(status_code=status.HTTP_204_NO_CONTENT, content={})
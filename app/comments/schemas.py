@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -12,7 +12,7 @@ class CommentCreate(BaseModel):
     parent_id: Optional[str] = None
 
 
-class Comment(BaseModel):
+class CommentBase(BaseModel):
     id: str
     content: str
 
@@ -25,11 +25,52 @@ class Comment(BaseModel):
 
     actor: UserPublic
 
+
+class Comment(CommentBase):
     children: List["Comment"] = []
 
 
 Comment.model_rebuild()
 
 
+class CommentThread(CommentBase):
+    children: List["CommentThread"] = []
+
+    # pass as `cursor` to `/comments/{id}/replies` to load more replies
+    replies_cursor: Optional[str] = None
+
+
+CommentThread.model_rebuild()
+
+
+class PaginatedCommentThreads(BaseModel):
+    results: List[CommentThread]
+    next_cursor: Optional[str] = None
+
+
+class CommentBulkItem(CommentCreate):
+    # the item's own key, for other items of the batch to reply to it with
+    # `parent_ref` before it has an id
+    ref: Optional[str] = None
+    parent_ref: Optional[str] = None
+
+
+class CommentBulkCreate(BaseModel):
+    items: List[CommentBulkItem]
+
+
+class CommentBulkResult(BaseModel):
+    ref: Optional[str] = None
+    # set when the item was created, otherwise `errors` says why it was not
+    id: Optional[str] = None
+    errors: Optional[Dict[str, List[str]]] = None
+
+
+class CommentBulkCreateResponse(BaseModel):
+    created: int
+    # in the order of the items
+    results: List[CommentBulkResult]
+
+
 class CommentUpdate(BaseModel):
     content: str
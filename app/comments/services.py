@@ -1,10 +1,94 @@
 import uuid
+from datetime import timedelta
+from typing import Optional, Union
+
+# psycopg
+from psycopg.errors import NotNullViolation
 
 # local imports
-from app.comments.schemas import Comment, CommentCreate, CommentUpdate
-from app.db import get_connection, release_connection
+from app.comments.helpers import comment_path_label
+from app.comments.schemas import (
+    Comment,
+    CommentBulkCreateResponse,
+    CommentBulkItem,
+    CommentBulkResult,
+    CommentCreate,
+    CommentThread,
+    CommentUpdate,
+    PaginatedCommentThreads,
+)
+from app.config import BULK_CREATE_MAX_ITEMS
+from app.core.exceptions import BadRequest, EntityNotFound
+from app.core.mapper import RowMapper, json_build_object
+from app.core.pagination import (
+    decode_cursor,
+    encode_cursor,
+    parse_timestamp,
+    parse_uuid,
+)
+from app.core.responses import RawJSON
+from app.core.statements import statements
+from app.core.string import normalize_uuid
+from app.core.versions import (
+    USERS,
+    ResourceVersion,
+    blog_key,
+    bump_versions,
+    comments_key,
+    get_version,
+    user_key,
+)
+from app.db import get_connection
 from app.users.schemas import UserPublic
 
+ACTOR_ROW = RowMapper(
+    UserPublic,
+    {
+        "id": "actor.id",
+        "username": "actor.username",
+        "created_at": "actor.created_at",
+        "updated_at": "actor.updated_at",
+    },
+)
+
+COMMENT_FIELDS: dict[str, Union[str, RowMapper]] = {
+    "id": "comment.id",
+    "content": "comment.content",
+    "actor_id": "comment.actor_id",
+    "blog_id": "comment.blog_id",
+    "parent_id": "comment.parent_id",
+    "created_at": "comment.created_at",
+    "updated_at": "comment.updated_at",
+    "actor": ACTOR_ROW,
+}
+
+COMMENT_ROW = RowMapper(Comment, COMMENT_FIELDS)
+
+# threads are read with the same columns
+THREAD_ROW = RowMapper(CommentThread, COMMENT_FIELDS)
+
+COMMENT_BY_ID = statements.register(
+    "comment_by_id",
+    f"""
+    SELECT
+        {COMMENT_ROW.columns}
+    FROM
+        comments comment
+    JOIN
+        users actor ON comment.actor_id = actor.id
+    WHERE
+        comment.id = %s
+    """,
+)
+
+# the JSON of a comment with its `children` left open, to be closed after
+# its replies, see `get_comments_by_blog_id`
+OPEN_COMMENT_JSON = (
+    "left("
+    + json_build_object({**COMMENT_ROW.json_fields, "children": "'[]'::json"})
+    + "::text, -2)"
+)
+
 
 class CommentService:
     @staticmethod
@@ -13,222 +97,855 @@ class CommentService:
         actor_id: str,
         data: CommentCreate,
     ) -> Comment:
-        conn = get_connection()
+        comment_id = str(uuid.uuid4())
+
         try:
-            comment_id = str(uuid.uuid4())
+            async with get_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        f"""
+                        WITH comment AS (
+                            INSERT INTO comments
+                            (id, content, blog_id, actor_id, parent_id, path)
+                            VALUES (
+                                %(id)s,
+                                %(content)s,
+                                %(blog_id)s,
+                                %(actor_id)s,
+                                %(parent_id)s,
+                                CASE
+                                    WHEN %(parent_id)s::uuid IS NULL
+                                    THEN comment_path_label(LOCALTIMESTAMP, %(id)s)
+                                    ELSE (
+                                        SELECT
+                                            parent.path || '.' || comment_path_label(
+                                                LOCALTIMESTAMP, %(id)s
+                                            )
+                                        FROM
+                                            comments parent
+                                        WHERE
+                                            parent.id = %(parent_id)s::uuid
+                                            AND parent.blog_id = %(blog_id)s::uuid
+                                    )
+                                END
+                            )
+                            RETURNING *
+                        ), blog AS (
+                            UPDATE blogs
+                            SET comment_count = blogs.comment_count + 1
+                            FROM comment
+                            WHERE blogs.id = comment.blog_id
+                        ), actor AS (
+                            UPDATE users
+                            SET comment_count = users.comment_count + 1
+                            FROM comment
+                            WHERE users.id = comment.actor_id
+                            RETURNING users.*
+                        )
+                        SELECT
+                            {COMMENT_ROW.columns}
+                        FROM
+                            comment
+                        JOIN
+                            actor ON comment.actor_id = actor.id
+                        """,
+                        {
+                            "id": comment_id,
+                            "content": data.content,
+                            "blog_id": blog_id,
+                            "actor_id": actor_id,
+                            "parent_id": data.parent_id,
+                        },
+                    )
+                    comment = await cur.fetchone()
+                    if comment is None:
+                        # only when the actor is gone
+                        raise EntityNotFound(
+                            name="Users",
+                            message=f"No user can be found with id: {actor_id}",
+                        )
+                    key = normalize_uuid(blog_id)
+                    # not BLOGS, see app.config.COMMENT_COUNTS_MAX_AGE
+                    await bump_versions(
+                        cur,
+                        [
+                            blog_key(key),
+                            comments_key(key),
+                            user_key(actor_id),
+                        ],
+                    )
+        except NotNullViolation as e:
+            # the path is only NULL when the parent is not on this blog
+            raise ValueError(
+                {"parent_id": ["Parent comment does not exist on this blog"]}
+            ) from e
+
+        return COMMENT_ROW.build(comment)
+
+    @staticmethod
+    async def bulk_create(
+        blog_id: str, actor_id: str, items: list[CommentBulkItem]
+    ) -> CommentBulkCreateResponse:
+        """
+        Create many comments of one actor on a blog at once, e.g. to import
+        them, in one transaction: the rows are sent with COPY and the
+        counters and versions they change are updated once for the batch.
+
+        An item replies either to a comment of the blog, by `parent_id`, or
+        to another item, by its `ref`, wherever it is in the batch. Paths are
+        worked out here rather than by the database, so the whole batch is
+        sent at once. Items which cannot be created, and the replies under
+        them, are reported in their results and the others created.
+        Comments are dated a microsecond apart in the order of `items`, so
+        replies to the same comment keep that order.
+        """
+        if len(items) > BULK_CREATE_MAX_ITEMS:
+            raise BadRequest(
+                name="Comments",
+                message=(
+                    f"At most {BULK_CREATE_MAX_ITEMS} comments can be created at once."
+                ),
+            )
+
+        errors: list[Optional[dict[str, list[str]]]] = [None] * len(items)
+        parent_ids: list[Optional[str]] = [None] * len(items)
+        indexes_by_ref: dict[str, int] = {}
+        for index, item in enumerate(items):
+            if item.ref is not None:
+                if item.ref in indexes_by_ref:
+                    errors[index] = {"ref": ["Another item has the same ref"]}
+                    continue
+                indexes_by_ref[item.ref] = index
 
-            with conn.cursor() as cur:
-                cur.execute(
+            if item.parent_id is not None:
+                if item.parent_ref is not None:
+                    errors[index] = {
+                        "parent_ref": ["Give either parent_id or parent_ref"]
+                    }
+                    continue
+                try:
+                    parent_ids[index] = str(uuid.UUID(item.parent_id))
+                except ValueError:
+                    errors[index] = {
+                        "parent_id": ["Parent comment does not exist on this blog"]
+                    }
+
+        ids = [str(uuid.uuid4()) for _ in items]
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                # the blog is locked until the comments are in, so it can't be
+                # deleted underneath them; KEY SHARE is the weakest lock which
+                # does that, and lets the UPDATE of its comment_count below
+                # (and other comments) go ahead without upgrading it
+                await cur.execute(
+                    "SELECT LOCALTIMESTAMP FROM blogs WHERE id = %s FOR KEY SHARE",
+                    (blog_id,),
+                )
+                blog = await cur.fetchone()
+                if blog is None:
+                    raise EntityNotFound(
+                        name="Blogs", message=f"No blog can be found with id: {blog_id}"
+                    )
+                created_at = [
+                    blog[0] + timedelta(microseconds=index)
+                    for index in range(len(items))
+                ]
+
+                parent_paths: dict[str, str] = {}
+                if any(parent_ids):
+                    await cur.execute(
+                        """
+                        SELECT id, path
+                        FROM comments
+                        WHERE blog_id = %s AND id = ANY(%s::uuid[])
+                        """,
+                        (blog_id, list(set(filter(None, parent_ids)))),
+                    )
+                    parent_paths = dict(await cur.fetchall())
+
+                paths = CommentService._get_bulk_paths(
+                    items,
+                    [
+                        comment_path_label(created_at[index], ids[index])
+                        for index in range(len(items))
+                    ],
+                    parent_ids,
+                    parent_paths,
+                    indexes_by_ref,
+                    errors,
+                )
+
+                created = 0
+                async with cur.copy(
                     """
-                INSERT INTO comments
-                (id, content, blog_id, actor_id, parent_id)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                    (
-                        comment_id,
-                        data.content,
-                        blog_id,
-                        actor_id,
-                        data.parent_id,
-                    ),
+                    COPY comments (
+                        id, content, blog_id, actor_id, parent_id, path,
+                        created_at, updated_at
+                    )
+                    FROM STDIN
+                    """
+                ) as copy:
+                    for index, item in enumerate(items):
+                        if paths[index] is None:
+                            continue
+
+                        parent_id = parent_ids[index]
+                        if item.parent_ref is not None:
+                            parent_id = ids[indexes_by_ref[item.parent_ref]]
+                        await copy.write_row(
+                            (
+                                ids[index],
+                                item.content,
+                                blog_id,
+                                actor_id,
+                                parent_id,
+                                paths[index],
+                                created_at[index],
+                                created_at[index],
+                            )
+                        )
+                        created += 1
+
+                if created:
+                    await cur.execute(
+                        """
+                        WITH blog AS (
+                            UPDATE blogs
+                            SET comment_count = blogs.comment_count + %(created)s
+                            WHERE id = %(blog_id)s
+                        )
+                        UPDATE users
+                        SET comment_count = users.comment_count + %(created)s
+                        WHERE id = %(actor_id)s
+                        """,
+                        {"created": created, "blog_id": blog_id, "actor_id": actor_id},
+                    )
+                    key = normalize_uuid(blog_id)
+                    # not BLOGS, see app.config.COMMENT_COUNTS_MAX_AGE
+                    await bump_versions(
+                        cur,
+                        [
+                            blog_key(key),
+                            comments_key(key),
+                            user_key(actor_id),
+                        ],
+                    )
+
+        return CommentBulkCreateResponse(
+            created=created,
+            results=[
+                CommentBulkResult(
+                    ref=item.ref,
+                    id=ids[index] if paths[index] is not None else None,
+                    errors=errors[index],
                 )
-                conn.commit()
-            return await CommentService.get_by_id(comment_id)
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            release_connection(conn)
+                for index, item in enumerate(items)
+            ],
+        )
+
+    @staticmethod
+    def _get_bulk_paths(
+        items: list[CommentBulkItem],
+        labels: list[str],
+        parent_ids: list[Optional[str]],
+        parent_paths: dict[str, str],
+        indexes_by_ref: dict[str, int],
+        errors: list[Optional[dict[str, list[str]]]],
+    ) -> list[Optional[str]]:
+        """
+        The path of every item of a bulk create, None for those which can't
+        be created, whose `errors` are filled in.
+
+        Replies by `parent_ref` are followed up to an item which replies to a
+        comment of the blog, or to none, and the paths of the chain are then
+        made on the way back down, so every item is settled once whatever the
+        order of the batch.
+        """
+        paths: list[Optional[str]] = [None] * len(items)
+        for start in range(len(items)):
+            chain: list[int] = []
+            # the items of `chain`, to find a loop without searching it
+            seen: set[int] = set()
+            index = start
+            while paths[index] is None and errors[index] is None:
+                item = items[index]
+                if item.parent_ref is None:
+                    parent_id = parent_ids[index]
+                    if parent_id is None:
+                        paths[index] = labels[index]
+                    elif parent_id in parent_paths:
+                        paths[index] = parent_paths[parent_id] + "." + labels[index]
+                    else:
+                        errors[index] = {
+                            "parent_id": ["Parent comment does not exist on this blog"]
+                        }
+                    break
+
+                parent = indexes_by_ref.get(item.parent_ref)
+                if parent is None:
+                    errors[index] = {"parent_ref": ["No item has this ref"]}
+                    break
+                if parent == index or parent in seen:
+                    errors[index] = {"parent_ref": ["Items reply to each other"]}
+                    break
+
+                chain.append(index)
+                seen.add(index)
+                index = parent
+
+            # `index` is settled; so are the replies leading to it, nearest first
+            for reply in reversed(chain):
+                path = paths[index]
+                if path is None:
+                    errors[reply] = {"parent_ref": ["The parent item can't be created"]}
+                else:
+                    paths[reply] = path + "." + labels[reply]
+                index = reply
+
+        return paths
 
     @staticmethod
     async def update(comment_id: str, data: CommentUpdate) -> Comment:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE comments
-                    SET
-                        content = %s
-                    WHERE
-                        id = %s
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    WITH comment AS (
+                        UPDATE comments
+                        SET
+                            content = %s
+                        WHERE
+                            id = %s
+                        RETURNING *
+                    )
+                    SELECT
+                        {COMMENT_ROW.columns}
+                    FROM
+                        comment
+                    JOIN
+                        users actor ON comment.actor_id = actor.id
                     """,
                     (
                         data.content,
                         comment_id,
                     ),
                 )
-                conn.commit()
-            return await CommentService.get_by_id(comment_id)
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            release_connection(conn)
+                comment = await cur.fetchone()
+                if comment is None:
+                    raise EntityNotFound(
+                        name="Comments",
+                        message=f"No comment can be found with id: {comment_id}",
+                    )
+                await bump_versions(cur, [comments_key(comment[3])])
+
+                return COMMENT_ROW.build(comment)
 
     @staticmethod
     async def get_by_id(comment_id: str) -> Comment:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await COMMENT_BY_ID.execute(cur, (comment_id,))
+                comment = await cur.fetchone()
+                if comment is None:
+                    raise EntityNotFound(
+                        name="Comments",
+                        message=f"No comment can be found with id: {comment_id}",
+                    )
+
+                return COMMENT_ROW.build(comment)
+
+    @staticmethod
+    async def get_comments_version(blog_id: str, variant: str) -> ResourceVersion:
+        """
+        The version of `get_comments_by_blog_id(blog_id, ...)`, `variant` being
+        its query.
+        """
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                # ids are keyed in their canonical form, whatever the form of
+                # the one asked for
+                key = normalize_uuid(blog_id) or blog_id
+                return await get_version(cur, [comments_key(key), USERS], variant)
+
+    @staticmethod
+    async def get_comments_by_blog_id(
+        blog_id: str, max_depth: Optional[int] = None, as_json: bool = False
+    ) -> Union[list[Comment], RawJSON]:
+        """
+        The comment tree of a blog, oldest first at every level, down to
+        `max_depth` levels of replies (unbounded when None).
+
+        Comments are read in one range scan of the (blog_id, path) index,
+        depth first, so each comment is read exactly once and a parent is
+        always built before its children.
+
+        With `as_json` Postgres builds the JSON of the tree from the same
+        scan and it comes back already serialized. Read depth first, a
+        comment is followed by its replies, so its `children` are left open
+        and closed, along with those of every parent it is the last reply
+        of, when the next comment is not one of its replies.
+        """
+        where = """
+                    WHERE
+                        comment.blog_id = %(blog_id)s
+                        AND (
+                            %(max_depth)s::int IS NULL
+                            OR comment_path_depth(comment.path) <= %(max_depth)s::int
+                        )
                     """
+        params = {"blog_id": blog_id, "max_depth": max_depth}
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                if as_json:
+                    await cur.execute(
+                        f"""
+                        SELECT
+                            '[' || COALESCE(string_agg(
+                                node.json || CASE
+                                    WHEN node.next_depth > node.depth THEN ''
+                                    WHEN node.next_depth IS NULL
+                                    THEN repeat(']}}', node.depth + 1)
+                                    ELSE repeat(
+                                        ']}}', node.depth - node.next_depth + 1
+                                    ) || ','
+                                END,
+                                '' ORDER BY node.path
+                            ), '') || ']'
+                        FROM (
+                            SELECT
+                                comment.path,
+                                comment_path_depth(comment.path) AS depth,
+                                lead(comment_path_depth(comment.path))
+                                    OVER (ORDER BY comment.path) AS next_depth,
+                                {OPEN_COMMENT_JSON} AS json
+                            FROM
+                                comments comment
+                            JOIN
+                                users actor ON comment.actor_id = actor.id
+                            {where}
+                        ) node
+                        """,
+                        params,
+                    )
+                    # an aggregate, so there is always one row
+                    [(tree,)] = await cur.fetchall()
+                    return RawJSON(tree.encode())
+
+                await cur.execute(
+                    f"""
                     SELECT
-                        comment.id,
-                        comment.content,
-                        comment.actor_id,
-                        comment.blog_id,
-                        comment.parent_id,
-                        comment.created_at,
-                        comment.updated_at,
-                        actor.id,
-                        actor.username,
-                        actor.created_at,
-                        actor.updated_at
+                        {COMMENT_ROW.columns}
                     FROM
                         comments comment
                     JOIN
-                        users actor on comment.actor_id = actor.id
+                        users actor ON comment.actor_id = actor.id
+                    {where}
+                    ORDER BY
+                        comment.path
+                    """,
+                    params,
+                )
+                rows = await cur.fetchall()
+
+        return CommentService._build_tree(rows)
+
+    @staticmethod
+    async def get_subtree(comment_id: str, max_depth: Optional[int] = None) -> Comment:
+        """
+        A comment with its replies nested under it, down to `max_depth`
+        levels (unbounded when None), read with one range scan of its path.
+        """
+        key = normalize_uuid(comment_id)
+        if key is None:
+            raise EntityNotFound(
+                name="Comments",
+                message=f"No comment can be found with id: {comment_id}",
+            )
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    SELECT
+                        {COMMENT_ROW.columns}
+                    FROM
+                        comments root
+                    JOIN
+                        comments comment ON comment.blog_id = root.blog_id
+                        AND comment.path >= root.path
+                        AND comment.path < root.path || '/'
+                    JOIN
+                        users actor ON comment.actor_id = actor.id
                     WHERE
-                        comment.id = %s
+                        root.id = %(comment_id)s
+                        AND (
+                            %(max_depth)s::int IS NULL
+                            OR comment_path_depth(comment.path)
+                            <= comment_path_depth(root.path) + %(max_depth)s::int
+                        )
+                    ORDER BY
+                        comment.path
                     """,
-                    (comment_id,),
+                    {"comment_id": key, "max_depth": max_depth},
                 )
-                comment = cur.fetchone()
-
-                return Comment(
-                    id=comment[0],
-                    content=comment[1],
-                    actor_id=comment[2],
-                    blog_id=comment[3],
-                    parent_id=comment[4],
-                    created_at=comment[5],
-                    updated_at=comment[6],
-                    actor=UserPublic(
-                        id=comment[7],
-                        username=comment[8],
-                        created_at=comment[9],
-                        updated_at=comment[10],
-                    ),
+                rows = await cur.fetchall()
+
+        if not rows:
+            raise EntityNotFound(
+                name="Comments",
+                message=f"No comment can be found with id: {comment_id}",
+            )
+
+        return CommentService._build_tree(rows)[0]
+
+    @staticmethod
+    async def get_ancestors(comment_id: str) -> list[Comment]:
+        """
+        The comments a comment is a reply to, top-level comment first,
+        looked up by the prefixes of its path.
+        """
+        key = normalize_uuid(comment_id)
+        if key is None:
+            raise EntityNotFound(
+                name="Comments",
+                message=f"No comment can be found with id: {comment_id}",
+            )
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    SELECT
+                        {COMMENT_ROW.columns}
+                    FROM
+                        comments target
+                    JOIN
+                        comments comment ON comment.blog_id = target.blog_id
+                        AND comment.path = ANY(
+                            ARRAY(
+                                SELECT left(target.path, 47 * depth - 1)
+                                FROM generate_series(
+                                    1, comment_path_depth(target.path)
+                                ) AS depth
+                            )
+                        )
+                    JOIN
+                        users actor ON comment.actor_id = actor.id
+                    WHERE
+                        target.id = %s
+                    ORDER BY
+                        comment.path
+                    """,
+                    (key,),
                 )
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            release_connection(conn)
+                rows = await cur.fetchall()
+
+        return COMMENT_ROW.build_all(rows)
 
     @staticmethod
-    async def get_comments_by_blog_id(blog_id: str) -> list[Comment]:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
+    async def get_threads(
+        blog_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        replies_limit: int = 3,
+        max_depth: int = 3,
+    ) -> PaginatedCommentThreads:
+        """
+        A page of the top-level comments of a blog, oldest first, each with
+        at most `replies_limit` replies per comment and `max_depth` levels
+        of them. Comments with replies left out carry a `replies_cursor` for
+        `get_replies`, so the cost of a page does not grow with the size of
+        the discussion.
+        """
+        key = normalize_uuid(blog_id)
+        if key is None:
+            raise EntityNotFound(
+                name="Blogs", message=f"No blog can be found with id: {blog_id}"
+            )
+
+        after = (
+            decode_cursor(cursor, c=parse_timestamp, i=parse_uuid, p=parse_uuid)
+            if cursor
+            else {}
+        )
+
+        threads, has_more = await CommentService._get_threads(
+            """
+                            comment.blog_id = %(parent)s
+                            AND comment.parent_id IS NULL
+            """,
+            key,
+            after,
+            limit,
+            replies_limit,
+            max_depth,
+        )
+
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(c=threads[-1].created_at, i=threads[-1].id)
+
+        return PaginatedCommentThreads(results=threads, next_cursor=next_cursor)
+
+    @staticmethod
+    async def get_replies(
+        comment_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        replies_limit: int = 3,
+        max_depth: int = 3,
+    ) -> PaginatedCommentThreads:
+        """
+        A page of the direct replies of a comment, shaped like `get_threads`.
+        `cursor` is a `replies_cursor` or `next_cursor` from a previous page.
+        """
+        key = normalize_uuid(comment_id)
+        if key is None:
+            raise EntityNotFound(
+                name="Comments",
+                message=f"No comment can be found with id: {comment_id}",
+            )
+
+        after = (
+            decode_cursor(cursor, c=parse_timestamp, i=parse_uuid, p=parse_uuid)
+            if cursor
+            else {}
+        )
+        if cursor and after.get("p") != key:
+            raise BadRequest(name="Pagination", message="Invalid cursor.")
+
+        threads, has_more = await CommentService._get_threads(
+            """
+                            comment.parent_id = %(parent)s
+            """,
+            key,
+            after,
+            limit,
+            replies_limit,
+            max_depth,
+        )
+
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(
+                p=key, c=threads[-1].created_at, i=threads[-1].id
+            )
+
+        return PaginatedCommentThreads(results=threads, next_cursor=next_cursor)
+
+    @staticmethod
+    async def _get_threads(
+        condition: str,
+        parent: str,
+        after: dict,
+        limit: int,
+        replies_limit: int,
+        max_depth: int,
+    ) -> tuple[list[CommentThread], bool]:
+        """
+        Load a page of the comments matching `condition`, positioned after
+        the (created_at, id) in `after`, and the capped reply trees under
+        them. One extra comment is read at every level to tell whether
+        there are more; those are marked as not expanded and are never
+        walked into.
+        """
+        if bool(after.get("c")) != bool(after.get("i")):
+            raise BadRequest(name="Pagination", message="Invalid cursor.")
+
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """
-                    WITH RECURSIVE comment_tree AS (
+                    WITH RECURSIVE page AS (
                         SELECT
-                            comment.id AS comment_id,
-                            comment.content,
-                            comment.actor_id,
-                            comment.blog_id,
-                            comment.parent_id,
-                            comment.created_at,
-                            comment.updated_at,
-                            actor.id,
-                            actor.username,
-                            actor.created_at,
-                            actor.updated_at,
-                            0 AS level
+                            comment.id,
+                            ROW_NUMBER() OVER (
+                                ORDER BY comment.created_at, comment.id
+                            ) AS position
                         FROM
                             comments comment
-                        JOIN
-                            users actor ON comment.actor_id = actor.id
                         WHERE
-                            comment.blog_id = %s
+                    """
+                    + condition
+                    + f"""
+                            AND (
+                                %(after_created_at)s::timestamp IS NULL
+                                OR (comment.created_at, comment.id) > (
+                                    %(after_created_at)s::timestamp,
+                                    %(after_id)s::uuid
+                                )
+                            )
+                        ORDER BY
+                            comment.created_at, comment.id
+                        LIMIT %(limit)s + 1
+                    ), comment_tree AS (
+                        SELECT
+                            page.id,
+                            0 AS depth,
+                            page.position <= %(limit)s AS expand
+                        FROM
+                            page
                         UNION ALL
                         SELECT
-                            comment.id,
-                            comment.content,
-                            comment.actor_id,
-                            comment.blog_id,
-                            comment.parent_id,
-                            comment.created_at,
-                            comment.updated_at,
-                            actor.id,
-                            actor.username,
-                            actor.created_at,
-                            actor.updated_at,
-                            level + 1
+                            reply.id,
+                            comment_tree.depth + 1,
+                            reply.position <= %(replies_limit)s
                         FROM
-                            comments comment
-                        JOIN
-                            users actor ON comment.actor_id = actor.id
-                        JOIN
-                            comment_tree ON comment.parent_id = comment_tree.comment_id
+                            comment_tree
+                        CROSS JOIN LATERAL (
+                            SELECT
+                                comment.id,
+                                ROW_NUMBER() OVER (
+                                    ORDER BY comment.created_at, comment.id
+                                ) AS position
+                            FROM
+                                comments comment
+                            WHERE
+                                comment.parent_id = comment_tree.id
+                            ORDER BY
+                                comment.created_at, comment.id
+                            LIMIT %(replies_limit)s + 1
+                        ) reply
+                        WHERE
+                            comment_tree.expand
+                            AND comment_tree.depth < %(max_depth)s
                     )
-                    SELECT * FROM comment_tree
+                    SELECT
+                        {COMMENT_ROW.columns},
+                        comment_tree.depth,
+                        comment_tree.expand,
+                        comment_tree.expand
+                        AND comment_tree.depth = %(max_depth)s
+                        AND EXISTS (
+                            SELECT 1 FROM comments reply
+                            WHERE reply.parent_id = comment.id
+                        )
+                    FROM
+                        comment_tree
+                    JOIN
+                        comments comment ON comment.id = comment_tree.id
+                    JOIN
+                        users actor ON comment.actor_id = actor.id
+                    ORDER BY
+                        comment_tree.depth, comment.created_at, comment.id
                     """,
-                    (blog_id,),
-                )
-                comments = cur.fetchall()
-
-            # Process comments into a hierarchy
-            comment_dict = {}
-            for row in comments:
-                comment = Comment(
-                    id=row[0],
-                    content=row[1],
-                    actor_id=row[2],
-                    blog_id=row[3],
-                    parent_id=row[4],
-                    created_at=row[5],
-                    updated_at=row[6],
-                    actor=UserPublic(
-                        id=row[7],
-                        username=row[8],
-                        created_at=row[9],
-                        updated_at=row[10],
-                    ),
+                    {
+                        "parent": parent,
+                        "after_created_at": after.get("c"),
+                        "after_id": after.get("i"),
+                        "limit": limit,
+                        "replies_limit": replies_limit,
+                        "max_depth": max_depth,
+                    },
                 )
-                comment_dict[comment.id] = comment
-
-            # Build hierarchy
-            for comment in comment_dict.values():
-                parent_id = comment.parent_id
-                if parent_id in comment_dict:
-                    parent_comment = comment_dict[parent_id]
-                    if not hasattr(parent_comment, "children"):
-                        parent_comment.children = []
-                    parent_comment.children.append(comment)
-
-            # Return top-level comments
-            return [
-                comment
-                for comment in comment_dict.values()
-                if comment.parent_id is None
-            ]
-
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            release_connection(conn)
+                rows = await cur.fetchall()
+
+        threads: dict[str, CommentThread] = {}
+        top_level: list[CommentThread] = []
+        has_more = False
+        for row, thread in zip(rows, THREAD_ROW.build_all(rows)):
+            depth, expand, has_hidden_replies = row[len(THREAD_ROW) :]
+            # replies are read after the comment they reply to
+            replied_to = (
+                threads[thread.parent_id] if depth and thread.parent_id else None
+            )
+
+            if not expand:
+                # the look-ahead row past a full page or a full set of replies
+                if replied_to is None:
+                    has_more = True
+                else:
+                    last = replied_to.children[-1] if replied_to.children else None
+                    replied_to.replies_cursor = (
+                        encode_cursor(p=replied_to.id, c=last.created_at, i=last.id)
+                        if last
+                        else encode_cursor(p=replied_to.id)
+                    )
+                continue
+
+            if has_hidden_replies:
+                thread.replies_cursor = encode_cursor(p=thread.id)
+            threads[thread.id] = thread
+
+            if replied_to is None:
+                top_level.append(thread)
+            else:
+                replied_to.children.append(thread)
+
+        return top_level, has_more
+
+    @staticmethod
+    def _build_tree(rows: list[tuple]) -> list[Comment]:
+        """
+        Nest comments read in path order under their parents in one pass.
+        Comments whose parent was not read are returned as the roots.
+        """
+        comments: dict[str, Comment] = {}
+        roots: list[Comment] = []
+        for comment in COMMENT_ROW.build_all(rows):
+            comments[comment.id] = comment
+
+            parent = comments.get(comment.parent_id) if comment.parent_id else None
+            if parent is None:
+                roots.append(comment)
+            else:
+                parent.children.append(comment)
+
+        return roots
 
     @staticmethod
     async def delete(comment_id: str):
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """
-                    DELETE FROM comments
+                    WITH target AS (
+                        SELECT blog_id, path FROM comments WHERE id = %s
+                    ), doomed AS (
+                        -- the comment and the replies the cascade takes with it
+                        SELECT comment.actor_id
+                        FROM target
+                        JOIN comments comment
+                            ON comment.blog_id = target.blog_id
+                            AND comment.path >= target.path
+                            AND comment.path < target.path || '/'
+                    ), deleted AS (
+                        DELETE FROM comments
+                        USING target
+                        WHERE
+                            comments.blog_id = target.blog_id
+                            AND comments.path = target.path
+                        RETURNING comments.id
+                    ), blog AS (
+                        UPDATE blogs
+                        SET comment_count = blogs.comment_count - (
+                            SELECT COUNT(*) FROM doomed
+                        )
+                        FROM target
+                        WHERE blogs.id = target.blog_id
+                    )
+                    UPDATE users
+                    SET comment_count = users.comment_count - doomed_by_actor.count
+                    FROM (
+                        SELECT actor_id, COUNT(*) AS count
+                        FROM doomed
+                        GROUP BY actor_id
+                    ) doomed_by_actor
                     WHERE
-                        id = %s
+                        users.id = doomed_by_actor.actor_id
+                    RETURNING users.id, (SELECT blog_id FROM target)
                     """,
                     (comment_id,),
                 )
-                conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            release_connection(conn)
+                # every actor whose counter changed, none if nothing was deleted
+                rows = await cur.fetchall()
+                if rows:
+                    blog_id = rows[0][1]
+                    # not BLOGS, see app.config.COMMENT_COUNTS_MAX_AGE
+                    await bump_versions(
+                        cur,
+                        [blog_key(blog_id), comments_key(blog_id)]
+                        + [user_key(row[0]) for row in rows],
+                    )
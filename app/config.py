@@ -8,3 +8,69 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# How listings report the total number of blogs: "exact" runs COUNT(*),
+# "counter" reads the transactionally maintained entity_counts row and
+# "estimate" reads the planner statistics from pg_class.reltuples.
+BLOG_COUNT_MODE = os.getenv("BLOG_COUNT_MODE", "counter").lower()
+
+# In-process cache of users by id, used on every authenticated request.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# In-process cache of blog ids by slug, used to serve blogs by slug. Slugs
+# never change, so entries only go when their blog is deleted.
+SLUG_CACHE_SIZE = int(os.getenv("SLUG_CACHE_SIZE", "10000"))
+
+# Argon2 parameters; hashes made with other parameters are upgraded on login.
+PASSWORD_HASH_TIME_COST = int(os.getenv("PASSWORD_HASH_TIME_COST", "3"))
+PASSWORD_HASH_MEMORY_COST = int(os.getenv("PASSWORD_HASH_MEMORY_COST", "65536"))
+PASSWORD_HASH_PARALLELISM = int(os.getenv("PASSWORD_HASH_PARALLELISM", "4"))
+
+# Password hashing runs off the event loop on a "thread" or "process" pool.
+# Once PASSWORD_HASHER_MAX_PENDING jobs are queued or running, further
+# requests are rejected with a 503 instead of piling up.
+PASSWORD_HASHER_EXECUTOR = os.getenv("PASSWORD_HASHER_EXECUTOR", "thread").lower()
+PASSWORD_HASHER_WORKERS = int(
+    os.getenv("PASSWORD_HASHER_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASHER_MAX_PENDING = int(os.getenv("PASSWORD_HASHER_MAX_PENDING", "64"))
+
+# Seconds between the background runs which repair drifted blog/comment
+# counters; 0 disables them.
+COUNTER_RECONCILE_INTERVAL = float(os.getenv("COUNTER_RECONCILE_INTERVAL", "3600"))
+
+# In-process cache of serialized anonymous GET responses (blog listing,
+# blogs and comment trees). Entries are dropped when a write in this worker
+# changes them; other workers only see the change once RESPONSE_CACHE_TTL
+# has passed. A RESPONSE_CACHE_MAX_BYTES of 0 disables the cache.
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 << 20)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+
+# Comment writes leave the version of the blog listing and search alone, so
+# they don't all queue on its row and drop every cached page; the comment
+# counts these show may instead be behind by up to COMMENT_COUNTS_MAX_AGE
+# seconds (0: until the next blog write).
+COMMENT_COUNTS_MAX_AGE = float(os.getenv("COMMENT_COUNTS_MAX_AGE", "60"))
+
+# Most items one call to the bulk create endpoints of blogs and comments may
+# carry.
+BULK_CREATE_MAX_ITEMS = int(os.getenv("BULK_CREATE_MAX_ITEMS", "10000"))
+
+# Most matches of a blog search which are ranked, the newest ones; it bounds
+# the cost of searches for words found in a large part of the blogs.
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+# Blog titles and slugs are indexed in memory for autocomplete, built at
+# startup. A worker updates it with its own writes; the writes of other
+# workers only show once it is rebuilt, every AUTOCOMPLETE_REBUILD_INTERVAL
+# seconds (0 never rebuilds it).
+AUTOCOMPLETE_REBUILD_INTERVAL = float(os.getenv("AUTOCOMPLETE_REBUILD_INTERVAL", "600"))
+
+# Blogs read per round trip by the streaming export (GET /api/blogs/export);
+# the memory an export takes is bounded by this, not by the number of blogs.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Have Postgres build the JSON of the blog listing and of comment trees
+# instead of building models from rows and serializing them here.
+DB_JSON_RESPONSES = os.getenv("DB_JSON_RESPONSES", "False").lower() == "true"
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from fastapi import HTTPException, Request
 
 # local imports
@@ -5,23 +7,41 @@ from app.users.schemas import User
 from app.users.services import UserService
 
 
-async def get_current_user(request: Request) -> User:
+async def get_request_user(request: Request) -> Optional[User]:
     """
-    A helper function useful to make a route authenticated route.
-    If the user is not authenticated, it raises an 401 HTTPException.
+    Resolve the user making the request from its Authorization header.
+
+    The token is decoded and the user loaded at most once per request. The
+    result (None for an anonymous request) is kept on `request.state.user`
+    and reused by the auth middleware and every dependency after it.
+    Raises ValueError if the token is invalid.
     """
+    if hasattr(request.state, "user"):
+        return request.state.user
+
     token = request.headers.get("Authorization")
+    user = await UserService.get_by_token(token) if token else None
+
+    request.state.user = user
+    return user
 
-    if token is None:
-        raise HTTPException(
-            status_code=401, detail="Authentication credentials were not provided."
-        )
 
+async def get_current_user(request: Request) -> User:
+    """
+    A helper function useful to make a route authenticated route.
+    If the user is not authenticated, it raises an 401 HTTPException.
+    """
     try:
-        user = await UserService.get_by_token(token)
-        return user
+        user = await get_request_user(request)
     except ValueError as e:
         raise HTTPException(status_code=401, detail=e.args[0]) from e
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail="Internal server error") from e
+
+    if user is None:
+        raise HTTPException(
+            status_code=401, detail="Authentication credentials were not provided."
+        )
+
+    return user
@@ -0,0 +1,159 @@
+from typing import Optional
+
+from psycopg import AsyncCursor, sql
+from psycopg.errors import SerializationFailure
+
+# local imports
+from app.config import BLOG_COUNT_MODE
+from app.core.versions import BLOGS, USERS, blog_key, bump_versions, user_key
+from app.db import get_connection
+
+COUNT_EXACT = "exact"
+COUNT_COUNTER = "counter"
+COUNT_ESTIMATE = "estimate"
+
+COUNT_MODES = (COUNT_EXACT, COUNT_COUNTER, COUNT_ESTIMATE)
+
+if BLOG_COUNT_MODE not in COUNT_MODES:
+    raise ValueError(f"BLOG_COUNT_MODE must be one of {', '.join(COUNT_MODES)}")
+
+
+async def get_count(cur: AsyncCursor, table: str, mode: str = BLOG_COUNT_MODE) -> int:
+    """
+    Number of rows in `table`.
+
+    `counter` reads the row of `entity_counts` which the services keep up to
+    date in the same transaction as their inserts and deletes, `estimate`
+    reads the planner's row estimate and `exact` falls back to COUNT(*).
+    Only `exact` has to scan the table.
+    """
+    if mode == COUNT_COUNTER:
+        await cur.execute("SELECT value FROM entity_counts WHERE name = %s", (table,))
+    elif mode == COUNT_ESTIMATE:
+        # reltuples is -1 for a table which has never been analyzed
+        await cur.execute(
+            """
+            SELECT GREATEST(reltuples, 0)::bigint
+            FROM pg_class
+            WHERE oid = %s::regclass
+            """,
+            (table,),
+        )
+    elif mode == COUNT_EXACT:
+        await cur.execute(
+            sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table))
+        )
+    else:
+        raise ValueError(f"Unknown count mode: {mode}")
+
+    row = await cur.fetchone()
+    return row[0] if row else 0
+
+
+# arbitrary key for the advisory lock which keeps concurrent
+# reconciliations, e.g. from several workers, from doubling up
+RECONCILE_LOCK_KEY = 727_001
+
+
+async def reconcile_counters() -> Optional[dict[str, int]]:
+    """
+    Recompute the denormalized counters from the rows they count and repair
+    those which have drifted, e.g. through writes made outside the services.
+    Returns how many counters of each kind were repaired, or None when
+    another worker is already reconciling or a write changed a counter
+    while it was being repaired.
+    """
+    try:
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                # the counts are read from one snapshot, and a counter changed
+                # by a write committed since then fails the UPDATE instead of
+                # being set back to the count from before the write
+                await cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                await cur.execute(
+                    "SELECT pg_try_advisory_xact_lock(%s)", (RECONCILE_LOCK_KEY,)
+                )
+                row = await cur.fetchone()
+                if not row or not row[0]:
+                    return None
+
+                repaired = {}
+                # the resources showing a repaired counter, to be given new versions
+                keys: set[str] = set()
+
+                await cur.execute(
+                    """
+                    UPDATE blogs
+                    SET comment_count = actual.count
+                    FROM (
+                        SELECT blogs.id, COUNT(comments.id) AS count
+                        FROM blogs
+                        LEFT JOIN comments ON comments.blog_id = blogs.id
+                        GROUP BY blogs.id
+                    ) actual
+                    WHERE
+                        blogs.id = actual.id
+                        AND blogs.comment_count <> actual.count
+                    RETURNING blogs.id
+                    """
+                )
+                repaired["blogs.comment_count"] = cur.rowcount
+                keys.update(blog_key(blog_id) for blog_id, in await cur.fetchall())
+
+                await cur.execute(
+                    """
+                    UPDATE users
+                    SET blog_count = actual.count
+                    FROM (
+                        SELECT users.id, COUNT(blogs.id) AS count
+                        FROM users
+                        LEFT JOIN blogs ON blogs.author_id = users.id
+                        GROUP BY users.id
+                    ) actual
+                    WHERE
+                        users.id = actual.id
+                        AND users.blog_count <> actual.count
+                    RETURNING users.id
+                    """
+                )
+                repaired["users.blog_count"] = cur.rowcount
+                keys.update(user_key(user_id) for user_id, in await cur.fetchall())
+
+                await cur.execute(
+                    """
+                    UPDATE users
+                    SET comment_count = actual.count
+                    FROM (
+                        SELECT users.id, COUNT(comments.id) AS count
+                        FROM users
+                        LEFT JOIN comments ON comments.actor_id = users.id
+                        GROUP BY users.id
+                    ) actual
+                    WHERE
+                        users.id = actual.id
+                        AND users.comment_count <> actual.count
+                    RETURNING users.id
+                    """
+                )
+                repaired["users.comment_count"] = cur.rowcount
+                keys.update(user_key(user_id) for user_id, in await cur.fetchall())
+
+                await cur.execute(
+                    """
+                    INSERT INTO entity_counts (name, value)
+                    SELECT 'blogs', COUNT(*) FROM blogs
+                    ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+                    WHERE entity_counts.value <> EXCLUDED.value
+                    """
+                )
+                repaired["entity_counts.blogs"] = cur.rowcount
+
+                if any(repaired.values()):
+                    # counters are shown in the listings too, users with their
+                    # blogs and comments
+                    await bump_versions(cur, [BLOGS, USERS, *keys])
+    except SerializationFailure:
+        # the next run retries
+        return None
+
+    return repaired
@@ -29,3 +29,7 @@ class AuthenticationFailed(APIError):
 
 class AuthorizationFailed(APIError):
     pass
+
+
+class ServiceUnavailable(APIError):
+    pass
@@ -0,0 +1,75 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+# local imports
+from app.core.exceptions import ServiceUnavailable
+
+T = TypeVar("T")
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+
+class BoundedExecutor:
+    """
+    Runs blocking or CPU heavy functions off the event loop on a thread or
+    process pool, with at most `max_pending` jobs queued or running at once.
+    Jobs beyond that are rejected with ServiceUnavailable so that a burst
+    sheds load instead of queueing without bound.
+
+    The pool itself is only started on first use.
+    """
+
+    def __init__(self, name: str, kind: str, max_workers: int, max_pending: int):
+        if kind not in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+            raise ValueError(
+                f"Executor kind must be {EXECUTOR_THREAD} or {EXECUTOR_PROCESS}"
+            )
+
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == EXECUTOR_PROCESS:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ServiceUnavailable(
+                name=self.name, message="Server is busy. Please try again later."
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,83 @@
+import asyncio
+from typing import (
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Iterable,
+    Mapping,
+    Optional,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Coalesces loads of single keys into batches.
+
+    Keys asked for by `load` are queued until the tasks which are ready to
+    run have had their turn, and are then fetched together with one call of
+    `batch_load`, which maps the keys it found to their values. So N
+    concurrent lookups by id cost one `id = ANY(...)` query instead of N.
+
+    Nothing is remembered once a batch is done; a later `load` of the same
+    key fetches it again, and sees the writes made since.
+    """
+
+    def __init__(self, batch_load: Callable[[list[K]], Awaitable[Mapping[K, V]]]):
+        self._batch_load = batch_load
+        self._queue: list[K] = []
+        # the loads queued or being fetched, shared by callers of the same key
+        self._pending: dict[K, asyncio.Future] = {}
+        self._batches: set[asyncio.Task] = set()
+
+        self.loads = 0
+        self.batches = 0
+
+    async def load(self, key: K) -> Optional[V]:
+        """
+        The value of `key`, or None if it was not found.
+        """
+        self.loads += 1
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[key] = loop.create_future()
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                loop.call_soon(self._dispatch)
+
+        # a caller giving up must not cancel the load for the others
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[K]) -> list[Optional[V]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        self.batches += 1
+        batch = asyncio.create_task(self._run(keys))
+        self._batches.add(batch)
+        batch.add_done_callback(self._batches.discard)
+
+    async def _run(self, keys: list[K]) -> None:
+        try:
+            values = await self._batch_load(keys)
+        except BaseException as e:
+            for key in keys:
+                future = self._pending.pop(key)
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # the callers may all have gone; don't warn about it then
+                    future.exception()
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for key in keys:
+            self._pending.pop(key).set_result(values.get(key))
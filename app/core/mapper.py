@@ -0,0 +1,134 @@
+from collections import defaultdict
+from operator import itemgetter
+from typing import Any, Callable, Generic, Iterable, Optional, Sequence, TypeVar, Union
+
+from pydantic import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def json_build_object(fields: dict[str, str]) -> str:
+    """
+    The SQL expression of a JSON object of `fields`, a map of names to the
+    SQL expressions of their values, in that order.
+    """
+    return (
+        "json_build_object("
+        + ", ".join(f"'{name}', {expression}" for name, expression in fields.items())
+        + ")"
+    )
+
+
+class RowMapper(Generic[M]):
+    """
+    The column layout of a query and how to build a model from its rows.
+
+    `fields` maps each field of `model` to the SQL expression selecting it,
+    or to another RowMapper for a nested model, whose columns follow in
+    place. `columns` is the matching select list, so a query written as
+    `SELECT {mapper.columns} ...` always lines up with `build`, and the
+    layout lives in one place. `json` is the same layout as an SQL
+    expression building the JSON of the model in the database (less the
+    fields left to their defaults), from the expressions in `json_fields`.
+
+    Models are validated as they are built. Nested models are passed in as
+    instances, which pydantic takes as they are, so those shared by
+    `build_all` are only validated once.
+    """
+
+    def __init__(
+        self,
+        model: type[M],
+        fields: dict[str, Union[str, "RowMapper"]],
+    ) -> None:
+        self.model = model
+        # what model_validate() calls, without its per call overhead
+        self._validate = model.__pydantic_validator__.validate_python
+
+        expressions: list[str] = []
+        names: list[str] = []
+        indexes: list[int] = []
+        self._nested: list[tuple[str, "RowMapper", int, int]] = []
+        self.json_fields: dict[str, str] = {}
+        for name, field in fields.items():
+            if isinstance(field, RowMapper):
+                start = len(expressions)
+                expressions.extend(field.expressions)
+                self._nested.append((name, field, start, len(expressions)))
+                self.json_fields[name] = field.json
+            else:
+                names.append(name)
+                indexes.append(len(expressions))
+                expressions.append(field)
+                self.json_fields[name] = field
+
+        self.expressions: tuple[str, ...] = tuple(expressions)
+        self.columns = ",\n".join(expressions)
+        self.json: str = json_build_object(self.json_fields)
+
+        self._names = tuple(names)
+        # zip() stops at the last name, so when the plain fields come first,
+        # as they mostly do, their values are read from the row as it is;
+        # otherwise the first index is repeated so a tuple comes back even
+        # for one column
+        self._get_columns: Optional[Callable[[Sequence[Any]], Sequence[Any]]] = (
+            None
+            if indexes == list(range(len(indexes)))
+            else itemgetter(*indexes, *indexes[:1])
+        )
+        # the values of a flat model are its row as it is, so a nested one is
+        # built in place rather than through another _build
+        self._flat = self._get_columns is None and not self._nested
+
+    def __len__(self) -> int:
+        return len(self.expressions)
+
+    def build(self, row: Sequence[Any], offset: int = 0, **extra: Any) -> M:
+        """
+        The model of the columns of `row` starting at `offset`. `extra`
+        fields are set as given.
+        """
+        if offset:
+            row = row[offset : offset + len(self.expressions)]
+        return self._build(row, None, extra)
+
+    def build_all(self, rows: Iterable[Sequence[Any]]) -> list[M]:
+        """
+        The models of `rows`. Nested models with the same first column (id),
+        such as the author of several blogs, are built once and shared.
+        """
+        # the models built so far by mapper, then by id
+        shared: defaultdict = defaultdict(dict)
+        build = self._build
+        return [build(row, shared, None) for row in rows]
+
+    def _build(
+        self,
+        row: Sequence[Any],
+        shared: Optional[dict],
+        extra: Optional[dict[str, Any]],
+    ) -> M:
+        get_columns = self._get_columns
+        values = dict(zip(self._names, get_columns(row) if get_columns else row))
+        for name, mapper, start, end in self._nested:
+            if shared is None:
+                values[name] = mapper._build(row[start:end], None, None)
+                continue
+
+            # within one result the first column, an id, identifies the rest
+            built = shared[mapper]
+            key = row[start]
+            nested = built.get(key)
+            if nested is None:
+                columns = row[start:end]
+                nested = built[key] = (
+                    mapper._validate(dict(zip(mapper._names, columns)))
+                    if mapper._flat
+                    else mapper._build(columns, shared, None)
+                )
+            values[name] = nested
+
+        if extra:
+            values.update(extra)
+
+        return self._validate(values)
@@ -1,27 +1,80 @@
+from typing import Callable
+
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.dependencies.models import Dependant
 from starlette.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 # local imports
-from app.users.services import UserService
-
-
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        token = request.headers.get("Authorization")
-
-        if token:
-            try:
-                user = await UserService.get_by_token(token)
-                if user:
-                    request.state.user = user
-            except ValueError as e:
-                return JSONResponse(status_code=401, content=e.args[0])
-            except Exception as e:
-                print(e)
-                return JSONResponse(
-                    status_code=500, content={"error": "Internal server error"}
+from app.core.auth import get_current_user, get_request_user
+
+# dependencies which read the user of the request
+USER_DEPENDENCIES: set[Callable] = {get_current_user, get_request_user}
+
+
+def depends_on_user(dependant: Dependant) -> bool:
+    return any(
+        dependency.call in USER_DEPENDENCIES or depends_on_user(dependency)
+        for dependency in dependant.dependencies
+    )
+
+
+class AuthMiddleware:
+    """
+    Resolve the user of a request before it reaches the routes, leaving it
+    on `request.state.user`. A bad token is answered with a 401.
+
+    This is a plain ASGI middleware, so unlike BaseHTTPMiddleware it adds no
+    extra task or memory stream around the response and streaming responses
+    pass straight through. Requests for routes which never read the user
+    skip the token work altogether.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        # keyed by id() since routes are not hashable
+        self._reads_user: dict[int, bool] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.route_reads_user(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        try:
+            await get_request_user(request)
+        except ValueError as e:
+            response = JSONResponse(status_code=401, content=e.args[0])
+            await response(scope, receive, send)
+            return
+        except Exception as e:
+            print(e)
+            response = JSONResponse(
+                status_code=500, content={"error": "Internal server error"}
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    def route_reads_user(self, scope: Scope) -> bool:
+        """
+        Whether the route the request is going to be dispatched to depends,
+        directly or through other dependencies, on the user. The answer is
+        worked out once per route.
+        """
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match != Match.FULL:
+                continue
+
+            key = id(route)
+            if key not in self._reads_user:
+                dependant = getattr(route, "dependant", None)
+                self._reads_user[key] = dependant is not None and depends_on_user(
+                    dependant
                 )
+            return self._reads_user[key]
 
-        response = await call_next(request)
-        return response
+        return False
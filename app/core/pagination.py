@@ -0,0 +1,64 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Callable
+
+# local imports
+from app.core.exceptions import BadRequest
+from app.core.string import normalize_uuid
+
+NEXT = "next"
+PREVIOUS = "previous"
+
+
+def encode_cursor(**values: Any) -> str:
+    """
+    Encode the values of a keyset position into an opaque, url safe cursor.
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def parse_timestamp(value: Any) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def parse_number(value: Any) -> float:
+    # bool is an int, and float() would also take strings
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{value!r} is not a number")
+    return float(value)
+
+
+def parse_uuid(value: Any) -> str:
+    key = normalize_uuid(value)
+    if key is None:
+        raise ValueError(f"{value!r} is not a uuid")
+    return key
+
+
+def decode_cursor(cursor: str, **fields: Callable[[Any], Any]) -> dict[str, Any]:
+    """
+    Decode a cursor made by `encode_cursor`. The values of `fields` found in
+    it are converted by their parser, e.g. `c=parse_timestamp`, so they are
+    checked before they reach a query.
+    Raises BadRequest if the cursor has been tampered with.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise BadRequest(name="Pagination", message="Invalid cursor.") from e
+
+    if not isinstance(values, dict):
+        raise BadRequest(name="Pagination", message="Invalid cursor.")
+
+    try:
+        for name, parse in fields.items():
+            if name in values:
+                values[name] = parse(values[name])
+    except (TypeError, ValueError) as e:
+        raise BadRequest(name="Pagination", message="Invalid cursor.") from e
+
+    return values
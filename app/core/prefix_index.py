@@ -0,0 +1,337 @@
+import asyncio
+import heapq
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Iterable,
+    Optional,
+    TypeVar,
+    cast,
+)
+
+# local imports
+from app.core.cache import LRUCache
+
+V = TypeVar("V")
+
+# sorts after every character, so [prefix, prefix + END) holds every key
+# starting with prefix
+END = "\U0010ffff"
+
+# the most keys a chunk holds before it is split in two
+CHUNK_SIZE = 2048
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class _Index(Generic[V]):
+    """
+    The data of a `PrefixIndex`, replaced as a whole when it is rebuilt.
+    """
+
+    def __init__(self) -> None:
+        # every key, sorted, in chunks of at most CHUNK_SIZE next to the slots
+        # of their entries; `maxes` is the last key of each chunk
+        self.key_chunks: list[list[str]] = []
+        self.slot_chunks: list[array] = []
+        self.maxes: list[str] = []
+
+        # the entries, by slot; a free slot holds None
+        self.values: list[Optional[V]] = []
+        self.scores = array("d")
+        self.slots: dict[Hashable, int] = {}
+        self.free: list[int] = []
+
+
+class PrefixIndex(Generic[V]):
+    """
+    An in-process index of short texts, such as titles, answering which
+    entries have a text starting with a prefix, most recent (highest score)
+    first.
+
+    The texts of an entry are taken from its value by `texts` and compared
+    case insensitively. They are kept sorted, so the texts starting with a
+    prefix are a contiguous range found with binary searches, and split in
+    chunks so that adding or removing one only moves the rest of its chunk.
+    Entries are stored by slot, the keys pointing at slots with 4 bytes each.
+
+    The best `max_results` entries of the prefixes searched for are cached,
+    until an entry with a text starting with one of them changes.
+
+    It is not thread safe; it is meant to be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        texts: Callable[[V], Iterable[str]],
+        max_results: int = 50,
+        cache_size: int = 1024,
+    ) -> None:
+        self._texts = texts
+        self.max_results = max_results
+        self._index: _Index[V] = _Index()
+        self._results: LRUCache[list[V]] = LRUCache(max_size=cache_size)
+        # changes made while a rebuild is loading, replayed on top of it
+        self._changes: Optional[list[tuple[Callable, tuple]]] = None
+
+        self.searches = 0
+        self.builds = 0
+        self.build_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._index.slots)
+
+    def set(self, id: Hashable, value: V, score: float) -> None:
+        """
+        Index the entry `id` with `value`, replacing what it had before.
+        """
+        self._log(self.set, (id, value, score))
+        self._remove(id)
+
+        index = self._index
+        if index.free:
+            slot = index.free.pop()
+            index.values[slot] = value
+            index.scores[slot] = score
+        else:
+            slot = len(index.values)
+            index.values.append(value)
+            index.scores.append(score)
+        index.slots[id] = slot
+
+        for key in self._keys(value):
+            self._insert(key, slot)
+            self._invalidate(key)
+
+    def remove(self, id: Hashable) -> None:
+        self._log(self.remove, (id,))
+        self._remove(id)
+
+    def search(self, prefix: str, limit: int) -> list[V]:
+        """
+        The values of the `limit` entries with the highest scores which have
+        a text starting with `prefix`, compared case insensitively.
+        """
+        self.searches += 1
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+
+        results = self._results.get(prefix)
+        if results is not None and limit <= self.max_results:
+            return results[:limit]
+
+        index = self._index
+        last = prefix + END
+        # an entry can match with more than one of its texts
+        slots: set[int] = set()
+        i = bisect_left(index.maxes, prefix)
+        while i < len(index.maxes):
+            keys = index.key_chunks[i]
+            start = bisect_left(keys, prefix)
+            end = bisect_left(keys, last, start)
+            slots.update(index.slot_chunks[i][start:end])
+            if end < len(keys):
+                break
+            i += 1
+
+        best = heapq.nlargest(
+            max(limit, self.max_results), slots, key=index.scores.__getitem__
+        )
+        # the slots of keys are never free
+        results = [cast(V, index.values[slot]) for slot in best]
+
+        self._results.set(prefix, results[: self.max_results])
+        return results[:limit]
+
+    async def rebuild(
+        self, load: Callable[[], Awaitable[Iterable[tuple[Hashable, V, float]]]]
+    ) -> None:
+        """
+        Replace the whole index with the (id, value, score) items returned by
+        `load`.
+
+        The index keeps answering while it is rebuilt: the new one is sorted
+        on a thread and swapped in at once, with the changes made since
+        `load` was called applied on top, so none of them are lost.
+        """
+        started = time.perf_counter()
+        self._changes = []
+        try:
+            items = await load()
+            index = await asyncio.to_thread(self._build, items)
+
+            changes = self._changes
+            self._changes = None
+            self._index = index
+            self._results.clear()
+            for change, args in changes:
+                change(*args)
+        finally:
+            self._changes = None
+
+        self.builds += 1
+        self.build_seconds = time.perf_counter() - started
+
+    def _build(self, items: Iterable[tuple[Hashable, V, float]]) -> _Index[V]:
+        index: _Index[V] = _Index()
+        values, scores, slots = index.values, index.scores, index.slots
+        keys: list[str] = []
+        key_slots = array("I")
+        for id, value, score in items:
+            slot = slots[id] = len(values)
+            values.append(value)
+            scores.append(score)
+            for key in self._keys(value):
+                keys.append(key)
+                key_slots.append(slot)
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        keys = [keys[i] for i in order]
+        key_slots = array("I", [key_slots[i] for i in order])
+        # half full, so the chunks have room to grow before being split
+        step = CHUNK_SIZE // 2
+        for start in range(0, len(keys), step):
+            index.key_chunks.append(keys[start : start + step])
+            index.slot_chunks.append(key_slots[start : start + step])
+            index.maxes.append(index.key_chunks[-1][-1])
+        return index
+
+    def _keys(self, value: V) -> list[str]:
+        keys = []
+        for text in self._texts(value):
+            key = normalize(text)
+            # keep one string when normalizing changes nothing, e.g. slugs
+            if key == text:
+                key = text
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
+    def _insert(self, key: str, slot: int) -> None:
+        index = self._index
+        if not index.maxes:
+            index.key_chunks.append([key])
+            index.slot_chunks.append(array("I", [slot]))
+            index.maxes.append(key)
+            return
+
+        i = min(bisect_left(index.maxes, key), len(index.maxes) - 1)
+        keys, slots = index.key_chunks[i], index.slot_chunks[i]
+        j = bisect_left(keys, key)
+        keys.insert(j, key)
+        slots.insert(j, slot)
+        index.maxes[i] = keys[-1]
+
+        if len(keys) > CHUNK_SIZE:
+            half = len(keys) // 2
+            index.key_chunks.insert(i + 1, keys[half:])
+            index.slot_chunks.insert(i + 1, slots[half:])
+            index.maxes.insert(i + 1, keys[-1])
+            del keys[half:]
+            del slots[half:]
+            index.maxes[i] = keys[-1]
+
+    def _delete(self, key: str, slot: int) -> None:
+        index = self._index
+        i = bisect_left(index.maxes, key)
+        # entries may share a key, and the copies of one may span chunks
+        while i < len(index.maxes):
+            keys, slots = index.key_chunks[i], index.slot_chunks[i]
+            j = bisect_left(keys, key)
+            while j < len(keys) and keys[j] == key:
+                if slots[j] == slot:
+                    del keys[j]
+                    del slots[j]
+                    if keys:
+                        index.maxes[i] = keys[-1]
+                    else:
+                        del index.key_chunks[i]
+                        del index.slot_chunks[i]
+                        del index.maxes[i]
+                    return
+                j += 1
+            i += 1
+
+    def _remove(self, id: Hashable) -> None:
+        index = self._index
+        slot = index.slots.pop(id, None)
+        if slot is None:
+            return
+
+        value = cast(V, index.values[slot])
+        for key in self._keys(value):
+            self._delete(key, slot)
+            self._invalidate(key)
+        index.values[slot] = None
+        index.free.append(slot)
+
+    def _invalidate(self, key: str) -> None:
+        """
+        Drop the cached results of every prefix of `key`.
+        """
+        for end in range(1, len(key) + 1):
+            self._results.invalidate(key[:end])
+
+    def _log(self, change: Callable, args: tuple) -> None:
+        if self._changes is not None:
+            self._changes.append((change, args))
+
+    def stats(self) -> dict[str, Any]:
+        index = self._index
+        return {
+            "entries": len(index.slots),
+            "keys": sum(len(keys) for keys in index.key_chunks),
+            "chunks": len(index.maxes),
+            "bytes": self._estimate_bytes(),
+            "searches": self.searches,
+            "results": self._results.stats(),
+            "builds": self.builds,
+            "build_seconds": self.build_seconds,
+        }
+
+    def _estimate_bytes(self, samples: int = 1000) -> int:
+        """
+        Roughly the memory held by the index, measuring the values and keys
+        of up to `samples` entries spread over it rather than all of them.
+        """
+        index = self._index
+        entries = [
+            value
+            for value in index.values[:: max(1, len(index.values) // samples)]
+            if value is not None
+        ]
+        size = (
+            sys.getsizeof(index.values)
+            + sys.getsizeof(index.scores)
+            + sys.getsizeof(index.slots)
+            + sys.getsizeof(index.free)
+            + sum(sys.getsizeof(keys) for keys in index.key_chunks)
+            + sum(sys.getsizeof(slots) for slots in index.slot_chunks)
+        )
+        if not entries:
+            return size
+
+        sampled = 0
+        for value in entries:
+            sampled += sys.getsizeof(value)
+            if isinstance(value, tuple):
+                sampled += sum(sys.getsizeof(item) for item in value)
+            texts = tuple(self._texts(value))
+            # keys are only stored apart from the texts when normalizing
+            # changed them
+            sampled += sum(
+                sys.getsizeof(key)
+                for key in self._keys(value)
+                if not any(key is text for text in texts)
+            )
+        return size + sampled * len(index.slots) // len(entries)
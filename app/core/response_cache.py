@@ -0,0 +1,219 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+
+# local imports
+from app.config import RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL
+from app.core.responses import FastJSONResponse, dumps
+from app.core.versions import ResourceVersion, version_listeners
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    version: ResourceVersion
+    expires_at: float
+    size: int
+
+    def respond(self, request: Request) -> Response:
+        if self.version.is_fresh(request):
+            return self.version.not_modified()
+
+        return Response(
+            content=self.body,
+            media_type="application/json",
+            headers=self.version.headers(),
+        )
+
+
+class ResponseCache:
+    """
+    A least recently used cache of serialized responses, bounded by the
+    bytes it holds, with a time to live per entry.
+
+    Entries are tagged with the `resource_versions` keys they were made from
+    and dropped as soon as a bump of one of them is committed. Concurrent
+    misses of the same key share one fill, so an expired or invalidated hot
+    entry is rebuilt once rather than by every request waiting on it.
+
+    It is not thread safe; it is meant to be used from the event loop.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._keys_by_tag: dict[str, set[str]] = {}
+        self._inflight: dict[str, asyncio.Future[CachedResponse]] = {}
+        # bumped on every invalidation, see `get_or_fill`
+        self._generation = 0
+
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.shared_fills = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    async def get_or_fill(
+        self, key: str, fill: Callable[[], Awaitable[tuple[ResourceVersion, bytes]]]
+    ) -> CachedResponse:
+        while True:
+            entry = self.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+
+            try:
+                shared = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # the request filling it went away; take over
+                if inflight.cancelled():
+                    continue
+                raise
+            self.shared_fills += 1
+            return shared
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            version, body = await fill()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # the waiters, if any, see it; don't warn about it otherwise
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+        entry = CachedResponse(
+            body=body,
+            version=version,
+            expires_at=time.monotonic() + self.ttl,
+            size=len(key) + len(body),
+        )
+        future.set_result(entry)
+
+        # what was read may predate a write committed while filling
+        if generation == self._generation:
+            self._set(key, entry)
+        return entry
+
+    def invalidate(self, tags: list[str]) -> None:
+        self._generation += 1
+        for tag in tags:
+            for key in self._keys_by_tag.pop(tag, ()):
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._keys_by_tag.clear()
+        self.bytes = 0
+
+    def _set(self, key: str, entry: CachedResponse) -> None:
+        if entry.size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        for tag in entry.version.keys:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.version.keys:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_fills": self.shared_fills,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(
+    max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL
+)
+version_listeners.append(response_cache.invalidate)
+
+
+async def cached_get(
+    request: Request,
+    get_version: Callable[[], Awaitable[ResourceVersion]],
+    load: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    Answer a GET for a versioned resource, with a 304 when the client holds
+    the current copy.
+
+    Anonymous responses are kept in the response cache, where a hit needs no
+    database at all. Other requests look the version up before calling
+    `load`, so a 304 for them costs one primary key lookup.
+    """
+    if "authorization" in request.headers or response_cache.max_bytes <= 0:
+        version = await get_version()
+        if version.is_fresh(request):
+            return version.not_modified()
+
+        return FastJSONResponse(content=await load(), headers=version.headers())
+
+    async def fill() -> tuple[ResourceVersion, bytes]:
+        # the version is read before the content, so it is never newer
+        version = await get_version()
+        content = await load()
+        return version, dumps(content)
+
+    key = request.url.path + "?" + request.url.query
+    entry = await response_cache.get_or_fill(key, fill)
+    return entry.respond(request)
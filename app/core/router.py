@@ -0,0 +1,43 @@
+from fastapi import APIRouter
+
+# local imports
+from app.blogs.services import slug_cache, title_index
+from app.core.response_cache import response_cache
+from app.core.statements import statements
+from app.users.helpers import password_executor
+from app.users.services import user_cache
+
+router = APIRouter()
+
+
+@router.get("/executors")
+async def get_executor_stats():
+    """
+    Load of the worker pools of this worker.
+    """
+    return {
+        "password_hasher": password_executor.stats(),
+    }
+
+
+@router.get("/caches")
+async def get_cache_stats():
+    """
+    Size and hit/miss statistics of the in-process caches and indexes of this
+    worker.
+    """
+    return {
+        "users": user_cache.stats(),
+        "responses": response_cache.stats(),
+        "slugs": slug_cache.stats(),
+        "blog_titles": title_index.stats(),
+    }
+
+
+@router.get("/statements")
+async def get_statement_stats():
+    """
+    How often each prepared statement has been run by this worker, and on how
+    many connections it was prepared.
+    """
+    return statements.stats()
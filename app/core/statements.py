@@ -0,0 +1,63 @@
+from typing import Any, Optional
+from weakref import WeakKeyDictionary
+
+from psycopg import AsyncConnection, AsyncCursor
+
+
+class Statement:
+    """
+    A query run as a server side prepared statement.
+
+    It is prepared on each pooled connection the first time it runs there
+    and executed by name from then on, so it is parsed and planned once per
+    connection rather than on every call. A connection opened to replace a
+    lost one prepares it again on first use.
+    """
+
+    def __init__(self, name: str, sql: str) -> None:
+        self.name = name
+        self.sql = sql
+
+        self.executions = 0
+        self.prepares = 0
+        # the connections it has been run on, which psycopg prepared it on
+        self._connections: WeakKeyDictionary[AsyncConnection, None] = (
+            WeakKeyDictionary()
+        )
+
+    async def execute(self, cur: AsyncCursor, params: Optional[Any] = None) -> None:
+        if cur.connection not in self._connections:
+            self._connections[cur.connection] = None
+            self.prepares += 1
+        self.executions += 1
+
+        await cur.execute(self.sql, params, prepare=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "executions": self.executions,
+            "prepares": self.prepares,
+            "connections": len(self._connections),
+        }
+
+
+class StatementRegistry:
+    """
+    The prepared statements of the hot queries, by name.
+    """
+
+    def __init__(self) -> None:
+        self._statements: dict[str, Statement] = {}
+
+    def register(self, name: str, sql: str) -> Statement:
+        if name in self._statements:
+            raise ValueError(f"A statement named {name} is already registered")
+
+        statement = self._statements[name] = Statement(name, sql)
+        return statement
+
+    def stats(self) -> dict[str, Any]:
+        return {name: statement.stats() for name, statement in self._statements.items()}
+
+
+statements = StatementRegistry()
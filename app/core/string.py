@@ -1,5 +1,6 @@
 import random
 import string
+import uuid
 
 
 def slugify(text):
@@ -8,3 +9,34 @@ def slugify(text):
 
 def random_string(length):
     return "".join(random.choices(string.ascii_letters + string.digits, k=length))
+
+
+def normalize_uuid(value):
+    """
+    The canonical form of `value` as a uuid, which is how ids are read from
+    the database, or None if it is not a uuid.
+    """
+    try:
+        return str(uuid.UUID(value))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+EXCERPT_LENGTH = 200
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """
+    The first `length` characters of `text` with its whitespace collapsed,
+    cut back to a word boundary and marked with an ellipsis when shortened.
+    `app/sql/add_blog_excerpts.sql` does the same in SQL; keep them in step.
+    """
+    text = " ".join(text.split())
+    if len(text) <= length:
+        return text
+
+    cut = text[:length]
+    space = cut.rfind(" ")
+    if space > 0:
+        cut = cut[:space]
+    return cut + "…"
@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+async def run_periodically(
+    func: Callable[[], Awaitable[Any]],
+    interval: float,
+    first_delay: Optional[float] = None,
+):
+    """
+    Call `func` every `interval` seconds until cancelled, the first time after
+    `first_delay` seconds (`interval` by default). With an `interval` of 0 it
+    is called once only. A failing run is logged and does not stop the ones
+    after it.
+    """
+    delay = interval if first_delay is None else first_delay
+    while True:
+        await asyncio.sleep(delay)
+        delay = interval
+        try:
+            result = await func()
+            print(f"{func.__name__}: {result}")
+        except Exception as e:
+            print(e)
+        if interval <= 0:
+            return
@@ -0,0 +1,148 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import partial
+from typing import Callable, Iterable, Optional
+
+from fastapi import Request, Response, status
+from psycopg import AsyncCursor
+
+# local imports
+from app.core.statements import statements
+from app.db import after_commit
+
+# keys of `resource_versions`, see app/sql/create_resource_versions_table.sql
+BLOGS = "blogs"
+USERS = "users"
+
+
+VERSIONS_BY_KEY = statements.register(
+    "versions_by_key",
+    """
+    SELECT key, version, updated_at
+    FROM resource_versions
+    WHERE key = ANY(%s::text[])
+    """,
+)
+
+# called with the keys of every committed bump, e.g. to drop cached copies
+version_listeners: list[Callable[[list[str]], None]] = []
+
+
+def blog_key(blog_id: str) -> str:
+    return f"blog:{blog_id}"
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def comments_key(blog_id: str) -> str:
+    return f"comments:{blog_id}"
+
+
+async def bump_versions(cur: AsyncCursor, keys: Iterable[str]) -> None:
+    """
+    Give the resources under `keys` a new version. Call it in the transaction
+    which changes them, so the new version is visible exactly when the change
+    is.
+    """
+    keys = sorted(set(keys))
+    await cur.execute(
+        """
+        INSERT INTO resource_versions (key, updated_at)
+        SELECT unnest(%s::text[]), clock_timestamp()
+        ON CONFLICT (key)
+        DO UPDATE SET
+            version = EXCLUDED.version,
+            -- read once the row lock is held, so later writers of a key
+            -- never record an earlier time than the ones before them
+            updated_at = clock_timestamp()
+        """,
+        # sorted, so concurrent bumps lock their rows in the same order
+        (keys,),
+    )
+
+    for listener in version_listeners:
+        after_commit(partial(listener, keys))
+
+
+@dataclass(frozen=True)
+class ResourceVersion:
+    """
+    The validators of a representation: a strong ETag and, when every
+    resource it is made from has a recorded version, its Last-Modified time.
+    """
+
+    # the resources the representation is made from
+    keys: tuple[str, ...]
+    etag: str
+    last_modified: Optional[datetime]
+
+    def headers(self) -> dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(
+                self.last_modified.astimezone(timezone.utc), usegmt=True
+            )
+        return headers
+
+    def is_fresh(self, request: Request) -> bool:
+        """
+        Whether the client's copy, as described by its If-None-Match or
+        (only when that is absent) If-Modified-Since header, is current.
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or self.last_modified is None:
+            return False
+
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+        # HTTP dates have whole seconds
+        return self.last_modified.replace(microsecond=0) <= since
+
+    def not_modified(self) -> Response:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers()
+        )
+
+    def apply(self, response: Response) -> None:
+        response.headers.update(self.headers())
+
+
+async def get_version(
+    cur: AsyncCursor, keys: list[str], variant: str = ""
+) -> ResourceVersion:
+    """
+    The version of a representation made from the resources under `keys`.
+    `variant` tells apart representations of the same resources, e.g. the
+    pages of a listing.
+    """
+    await VERSIONS_BY_KEY.execute(cur, (keys,))
+    versions = {row[0]: (row[1], row[2]) for row in await cur.fetchall()}
+
+    digest = hashlib.sha1(variant.encode())
+    for key in sorted(keys):
+        version, _ = versions.get(key, (0, None))
+        digest.update(f"\0{key}={version}".encode())
+
+    last_modified = None
+    if versions and versions.keys() >= set(keys):
+        last_modified = max(updated_at for _, updated_at in versions.values())
+
+    return ResourceVersion(
+        keys=tuple(keys),
+        etag=f'"{digest.hexdigest()[:32]}"',
+        last_modified=last_modified,
+    )
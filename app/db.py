@@ -1,30 +1,186 @@
-from contextlib import contextmanager  # NOQA: F401
-from typing import Any, Generator  # NOQA: F401
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Optional
 
-import psycopg2
-from psycopg2 import pool  # NOQA: F401
+from psycopg import AsyncConnection
+from psycopg.types.string import TextLoader
+from psycopg_pool import AsyncConnectionPool
 
 from app.config import DATABASE_URL
+from app.core.loader import DataLoader
 
-connection_pool = psycopg2.pool.SimpleConnectionPool(
-    minconn=1, maxconn=10, dsn=DATABASE_URL
+
+async def configure_connection(conn: AsyncConnection) -> None:
+    """
+    Configure a freshly opened connection before it joins the pool.
+    UUID columns are loaded as plain strings, the same as psycopg2 did,
+    so the schemas keep receiving `str` ids.
+    """
+    conn.adapters.register_loader("uuid", TextLoader)
+
+
+connection_pool = AsyncConnectionPool(
+    conninfo=DATABASE_URL or "",
+    min_size=1,
+    max_size=10,
+    configure=configure_connection,
+    open=False,
 )
 
 
-def get_connection() -> psycopg2.extensions.connection:
+class UnitOfWork:
+    """
+    A transaction shared by every `get_connection()` made while it is bound
+    to the current context. The connection is only taken from the pool when
+    it is first asked for, so a request which never queries never waits on
+    the pool.
+
+    It also holds the DataLoaders of the request (see `loader`), so lookups
+    made concurrently while it is bound are batched together.
+    """
+
+    def __init__(self) -> None:
+        self._connection: Optional[AsyncConnection] = None
+        # concurrent tasks of a request, e.g. loader batches, share it
+        self._connection_lock = asyncio.Lock()
+        self._stack = AsyncExitStack()
+        self._after_commit: list[Callable[[], Any]] = []
+        self._loaders: dict[Callable, DataLoader] = {}
+
+    async def connection(self) -> AsyncConnection:
+        if self._connection is None:
+            async with self._connection_lock:
+                if self._connection is None:
+                    self._connection = await self._stack.enter_async_context(
+                        connection_pool.connection()
+                    )
+        return self._connection
+
+    def loader(self, batch_load: Callable) -> DataLoader:
+        """
+        The DataLoader of `batch_load` in this unit of work.
+        """
+        loader = self._loaders.get(batch_load)
+        if loader is None:
+            loader = self._loaders[batch_load] = DataLoader(batch_load)
+        return loader
+
+    def after_commit(self, callback: Callable[[], Any]) -> None:
+        self._after_commit.append(callback)
+
+    async def __aenter__(self) -> "UnitOfWork":
+        await self._stack.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info) -> Optional[bool]:
+        # the pool commits, or rolls back if the block raised
+        suppress = await self._stack.__aexit__(*exc_info)
+        if exc_info[0] is None:
+            for callback in self._after_commit:
+                callback()
+        return suppress
+
+
+_current_unit_of_work: ContextVar[Optional[UnitOfWork]] = ContextVar(
+    "current_unit_of_work", default=None
+)
+
+
+async def open_pool() -> None:
+    """
+    Open the connection pool. Called once on application startup.
+    """
+    await connection_pool.open()
+
+
+async def close_pool() -> None:
+    """
+    Close the connection pool. Called once on application shutdown.
+    """
+    await connection_pool.close()
+
+
+@asynccontextmanager
+async def get_connection() -> AsyncIterator[AsyncConnection]:
     """
     Get a connection from the connection pool.
+
+    Inside a unit of work the connection bound to it is reused and the
+    transaction is left for the unit of work to finish. Otherwise the block
+    runs in its own transaction which is committed when it exits normally
+    and rolled back if it raises, after which the connection is released
+    back to the pool.
+    """
+    async with unit_of_work() as uow:
+        yield await uow.connection()
+
+
+@asynccontextmanager
+async def get_own_connection() -> AsyncIterator[AsyncConnection]:
+    """
+    Get a connection from the pool which is not bound to the unit of work of
+    the current context, for reads which outlive it such as the body of a
+    streamed response. The block runs in its own transaction.
+    """
+    async with connection_pool.connection() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[UnitOfWork]:
+    """
+    Bind a single transaction to the current context. Every
+    `get_connection()` made inside the block shares it, and everything is
+    committed (or rolled back) together when the block exits.
+    """
+    uow = _current_unit_of_work.get()
+    if uow is not None:
+        yield uow
+        return
+
+    uow = UnitOfWork()
+    token = _current_unit_of_work.set(uow)
+    try:
+        async with uow:
+            yield uow
+    finally:
+        _current_unit_of_work.reset(token)
+
+
+def after_commit(callback: Callable[[], Any]) -> None:
+    """
+    Call `callback` once the current transaction has been committed, e.g. to
+    drop what it made stale from in-process caches. It is never called if the
+    transaction is rolled back.
+    """
+    uow = _current_unit_of_work.get()
+    if uow is None:
+        raise RuntimeError("after_commit() called outside of a transaction")
+    uow.after_commit(callback)
+
+
+async def load(batch_load: Callable, key: Any) -> Any:
+    """
+    Load `key` with the DataLoader of `batch_load` in the current unit of
+    work, so it is fetched in one batch with the other keys loaded
+    concurrently.
+    """
+    async with unit_of_work() as uow:
+        return await uow.loader(batch_load).load(key)
+
+
+async def load_many(batch_load: Callable, keys: list) -> list:
+    """
+    `load` each of `keys`, in one batch.
     """
-    conn = connection_pool.getconn()
-    print(f"\n\033[34m{get_connection.__name__}: Acquired connection {conn}\033[0m\n")
-    return conn
+    async with unit_of_work() as uow:
+        return await uow.loader(batch_load).load_many(keys)
 
 
-def release_connection(conn: psycopg2.extensions.connection) -> None:
+async def get_unit_of_work() -> AsyncIterator[UnitOfWork]:
     """
-    Release a connection back to the connection pool.
+    Dependency which runs a whole request in one unit of work.
     """
-    connection_pool.putconn(conn)
-    print(
-        f"\n\033[34m{release_connection.__name__}: Released connection {conn}\033[0m\n"
-    )
+    async with unit_of_work() as uow:
+        yield uow
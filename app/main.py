@@ -1,4 +1,6 @@
-from typing import Callable
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Callable
 
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
@@ -6,8 +8,11 @@ from fastapi.responses import JSONResponse
 
 # local imports
 from app.blogs import router as blog_router
+from app.blogs.services import BlogService
 from app.comments import router as comment_router
-from app.config import DEBUG
+from app.config import AUTOCOMPLETE_REBUILD_INTERVAL, COUNTER_RECONCILE_INTERVAL, DEBUG
+from app.core import router as core_router
+from app.core.counts import reconcile_counters
 from app.core.exceptions import (
     APIError,
     AuthenticationFailed,
@@ -15,17 +20,56 @@ from app.core.exceptions import (
     BadRequest,
     EntityAlreadyExist,
     EntityNotFound,
+    ServiceUnavailable,
 )
 from app.core.middleware.auth_middleware import AuthMiddleware
+from app.core.tasks import run_periodically
+from app.db import close_pool, open_pool
 from app.users import router as user_router
+from app.users.helpers import password_executor
 
-app = FastAPI(title="FastAPI Blogs", debug=DEBUG)
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await open_pool()
+
+    tasks = []
+    if COUNTER_RECONCILE_INTERVAL > 0:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically(reconcile_counters, COUNTER_RECONCILE_INTERVAL)
+            )
+        )
+    # built in the background so that startup doesn't wait for it; there are
+    # no suggestions until it is
+    tasks.append(
+        asyncio.create_task(
+            run_periodically(
+                BlogService.rebuild_title_index,
+                AUTOCOMPLETE_REBUILD_INTERVAL,
+                first_delay=0,
+            )
+        )
+    )
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    password_executor.shutdown()
+    await close_pool()
+
+
+app = FastAPI(title="FastAPI Blogs", debug=DEBUG, lifespan=lifespan)
 
 app.add_middleware(AuthMiddleware)
 
 app.include_router(user_router.router, prefix="/api/users", tags=["users"])
 app.include_router(blog_router.router, prefix="/api/blogs", tags=["blogs"])
 app.include_router(comment_router.router, prefix="/api/comments", tags=["comments"])
+app.include_router(core_router.router, prefix="/api/stats", tags=["stats"])
 
 
 def create_exception_handler(
@@ -83,6 +127,14 @@ app.add_exception_handler(
 )
 
 
+app.add_exception_handler(
+    exc_class_or_status_code=ServiceUnavailable,
+    handler=create_exception_handler(
+        status.HTTP_503_SERVICE_UNAVAILABLE, "Service unavailable."
+    ),
+)
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(_: Request, exc: RequestValidationError):
     errors = exc.errors()
@@ -0,0 +1,15 @@
+-- Adds the excerpt column used by the summary view of the blog listing and
+-- fills it in the same way as app.core.string.make_excerpt. Safe to run more
+-- than once.
+ALTER TABLE blogs ADD COLUMN IF NOT EXISTS excerpt TEXT NOT NULL DEFAULT '';
+
+UPDATE blogs
+SET excerpt = CASE
+  WHEN length(text) <= 200 THEN text
+  ELSE regexp_replace(left(text, 200), ' [^ ]*$', '') || '…'
+END
+FROM (
+  SELECT id, btrim(regexp_replace(COALESCE(content, ''), '\s+', ' ', 'g')) AS text
+  FROM blogs
+) collapsed
+WHERE blogs.id = collapsed.id;
@@ -0,0 +1,10 @@
+-- Adds the index the blog listing seeks on with its keyset cursors
+-- (created_at, id), newest first, and drops the created_at index it
+-- replaces. Safe to run more than once.
+--
+-- The indexes are built and dropped without blocking writes, so this file is
+-- not run in a transaction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blogs_created_at_id
+ON blogs(created_at DESC, id DESC);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_blogs_created_at;
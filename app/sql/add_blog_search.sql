@@ -0,0 +1,15 @@
+-- Adds the full text search column and index used by the blog search
+-- (GET /api/blogs/search). The column is generated, so Postgres keeps it in
+-- step with every insert and update of a title or content. Safe to run more
+-- than once.
+--
+-- Adding the column rewrites the table; on a large table run it at a quiet
+-- time. The index is built without blocking writes, so this file is not run
+-- in a transaction.
+ALTER TABLE blogs ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', COALESCE(title, '')), 'A')
+  || setweight(to_tsvector('english', COALESCE(content, '')), 'B')
+) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blogs_search_vector
+ON blogs USING GIN (search_vector);
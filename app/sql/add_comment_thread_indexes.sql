@@ -0,0 +1,12 @@
+-- Adds the indexes comment threads are paged with, on (created_at, id) among
+-- the top-level comments of a blog and among the replies of a comment. Safe
+-- to run more than once.
+--
+-- The indexes are built without blocking writes, so this file is not run in a
+-- transaction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comments_top_level
+ON comments(blog_id, created_at, id)
+WHERE parent_id IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comments_parent_id_created_at
+ON comments(parent_id, created_at, id);
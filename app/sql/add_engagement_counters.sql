@@ -0,0 +1,22 @@
+-- Adds the denormalized engagement counters to an existing database and
+-- fills them in. Safe to run more than once.
+ALTER TABLE blogs ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS blog_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE blogs
+SET comment_count = (
+  SELECT COUNT(*) FROM comments WHERE comments.blog_id = blogs.id
+);
+
+UPDATE users
+SET
+  blog_count = (SELECT COUNT(*) FROM blogs WHERE blogs.author_id = users.id),
+  comment_count = (SELECT COUNT(*) FROM comments WHERE comments.actor_id = users.id);
+
+-- counter updates are not edits of the blog
+DROP TRIGGER IF EXISTS set_updated_at ON blogs;
+CREATE TRIGGER set_updated_at
+BEFORE UPDATE OF title, slug, content ON blogs
+FOR EACH ROW
+EXECUTE FUNCTION update_updated_at_column();
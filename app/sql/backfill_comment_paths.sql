@@ -0,0 +1,51 @@
+-- Adds the materialized path column to an existing comments table and fills
+-- it in for every comment. Safe to run more than once; rows which already
+-- have the right path are left alone.
+
+BEGIN;
+
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS path TEXT COLLATE "C";
+
+CREATE OR REPLACE FUNCTION comment_path_label(created_at TIMESTAMP, id UUID)
+RETURNS TEXT AS $$
+  SELECT lpad(to_hex((extract(epoch FROM created_at) * 1000000)::BIGINT), 14, '0')
+    || replace(id::TEXT, '-', '')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION comment_path_depth(path TEXT)
+RETURNS INTEGER AS $$
+  SELECT length(path) / 47
+$$ LANGUAGE sql IMMUTABLE;
+
+WITH RECURSIVE comment_tree AS (
+    SELECT
+        comment.id,
+        comment_path_label(comment.created_at, comment.id) AS path
+    FROM
+        comments comment
+    WHERE
+        comment.parent_id IS NULL
+    UNION ALL
+    SELECT
+        comment.id,
+        comment_tree.path || '.' || comment_path_label(comment.created_at, comment.id)
+    FROM
+        comments comment
+    JOIN
+        comment_tree ON comment.parent_id = comment_tree.id
+)
+UPDATE comments
+SET path = comment_tree.path
+FROM comment_tree
+WHERE
+    comments.id = comment_tree.id
+    AND comments.path IS DISTINCT FROM comment_tree.path;
+
+ALTER TABLE comments ALTER COLUMN path SET NOT NULL;
+
+-- replaced by idx_comments_blog_id_path; only databases which ran
+-- create_comment_table.sql before paths were added have it
+DROP INDEX IF EXISTS idx_comments_blog_id_created_at;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_comments_blog_id_path ON comments(blog_id, path);
+
+COMMIT;
@@ -9,6 +9,17 @@ CREATE TABLE blogs (
   title VARCHAR(255),
   slug VARCHAR(265),
   content TEXT,
+  -- short plain text preview for listings, see app.core.string.make_excerpt
+  excerpt TEXT NOT NULL DEFAULT '',
+
+  -- denormalized counters, kept up to date by the services
+  comment_count INTEGER NOT NULL DEFAULT 0,
+
+  -- full text search, title weighted over content, see BlogService.search
+  search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', COALESCE(title, '')), 'A')
+    || setweight(to_tsvector('english', COALESCE(content, '')), 'B')
+  ) STORED,
 
   -- author
   author_id UUID REFERENCES users(id) ON DELETE CASCADE,
@@ -21,7 +32,10 @@ CREATE TABLE blogs (
   CONSTRAINT unique_slug UNIQUE (slug)
 );
 
-CREATE INDEX idx_blogs_created_at ON blogs(created_at);
+-- keyset pagination seeks on (created_at, id), newest first
+CREATE INDEX idx_blogs_created_at_id ON blogs(created_at DESC, id DESC);
+
+CREATE INDEX idx_blogs_search_vector ON blogs USING GIN (search_vector);
 
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -32,7 +46,8 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+-- counter updates are not edits of the blog
 CREATE TRIGGER set_updated_at
-BEFORE UPDATE ON blogs
+BEFORE UPDATE OF title, slug, content ON blogs
 FOR EACH ROW
 EXECUTE FUNCTION update_updated_at_column();
@@ -11,10 +11,37 @@ CREATE TABLE comments (
     blog_id UUID REFERENCES blogs(id) ON DELETE CASCADE,
     parent_id UUID REFERENCES comments(id) ON DELETE CASCADE,
 
+    -- materialized path, see comment_path_label below
+    path TEXT COLLATE "C" NOT NULL,
+
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- The path of a comment is the labels of its ancestors and itself joined
+-- by '.'. A label is the creation time in microseconds (14 hex digits)
+-- followed by the id (32 hex digits), so every label is 46 characters long,
+-- siblings sort by age and sorting by path walks a thread depth first.
+-- The subtree of a comment is the range [path, path || '/') and its
+-- ancestors are the 47 character prefixes of its path.
+CREATE OR REPLACE FUNCTION comment_path_label(created_at TIMESTAMP, id UUID)
+RETURNS TEXT AS $$
+  SELECT lpad(to_hex((extract(epoch FROM created_at) * 1000000)::BIGINT), 14, '0')
+    || replace(id::TEXT, '-', '')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION comment_path_depth(path TEXT)
+RETURNS INTEGER AS $$
+  SELECT length(path) / 47
+$$ LANGUAGE sql IMMUTABLE;
+
+-- whole threads, subtrees and ancestors are all read from this index
+CREATE UNIQUE INDEX idx_comments_blog_id_path ON comments(blog_id, path);
+
+-- threads are paged on (created_at, id) at every level
+CREATE INDEX idx_comments_top_level ON comments(blog_id, created_at, id)
+WHERE parent_id IS NULL;
+CREATE INDEX idx_comments_parent_id_created_at ON comments(parent_id, created_at, id);
 
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
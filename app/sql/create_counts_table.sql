@@ -0,0 +1,11 @@
+DROP TABLE IF EXISTS entity_counts CASCADE;
+
+-- Row counts maintained by the services in the same transaction as their
+-- inserts and deletes, so listings never have to COUNT(*) a whole table.
+CREATE TABLE entity_counts (
+  name VARCHAR(64) PRIMARY KEY,
+  value BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO entity_counts (name, value)
+SELECT 'blogs', COUNT(*) FROM blogs;
@@ -0,0 +1,30 @@
+DROP TABLE IF EXISTS resource_versions CASCADE;
+
+-- Versions are drawn from one sequence, so recreating the table never hands
+-- out a version which an earlier ETag was already made from.
+CREATE SEQUENCE IF NOT EXISTS resource_version_seq;
+
+-- The version of every cacheable resource, bumped by the services in the
+-- same transaction as the writes which change it. Conditional GETs compare
+-- these instead of running the query behind the resource.
+--   blogs               the blog listing
+--   blog:<id>           a blog
+--   user:<id>           a user, as the author of their blogs
+--   users               every user, as the actor of their comments
+--   comments:<blog_id>  the comment tree of a blog
+CREATE TABLE resource_versions (
+  key VARCHAR(64) PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT nextval('resource_version_seq'),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO resource_versions (key)
+SELECT 'blogs'
+UNION ALL
+SELECT 'users'
+UNION ALL
+SELECT 'blog:' || id FROM blogs
+UNION ALL
+SELECT 'comments:' || id FROM blogs
+UNION ALL
+SELECT 'user:' || id FROM users;
@@ -1,24 +1,63 @@
+from typing import Optional
+
 # argon
 from argon2 import PasswordHasher
 from argon2.exceptions import InvalidHash, VerificationError
 
-# psycopg2
-from psycopg2.errors import UniqueViolation
+# psycopg
+from psycopg.errors import UniqueViolation
+
+# local imports
+from app.config import (
+    PASSWORD_HASH_MEMORY_COST,
+    PASSWORD_HASH_PARALLELISM,
+    PASSWORD_HASH_TIME_COST,
+    PASSWORD_HASHER_EXECUTOR,
+    PASSWORD_HASHER_MAX_PENDING,
+    PASSWORD_HASHER_WORKERS,
+)
+from app.core.executor import BoundedExecutor
+
+password_hasher = PasswordHasher(
+    time_cost=PASSWORD_HASH_TIME_COST,
+    memory_cost=PASSWORD_HASH_MEMORY_COST,
+    parallelism=PASSWORD_HASH_PARALLELISM,
+)
+
+# Argon2 is deliberately slow, so it never runs on the event loop
+password_executor = BoundedExecutor(
+    name="password-hasher",
+    kind=PASSWORD_HASHER_EXECUTOR,
+    max_workers=PASSWORD_HASHER_WORKERS,
+    max_pending=PASSWORD_HASHER_MAX_PENDING,
+)
 
 
 def hash_password(password: str) -> str:
-    hasher = PasswordHasher()
-    return hasher.hash(password)
+    return password_hasher.hash(password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    hasher = PasswordHasher()
     try:
-        return hasher.verify(password_hash, password)
+        return password_hasher.verify(password_hash, password)
     except (InvalidHash, VerificationError):
         return False
 
 
+def verify_and_rehash(password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+    """
+    Verify a password, and if the hash was made with other parameters than
+    the current ones also return a fresh hash to store in its place.
+    """
+    if not verify_password(password, password_hash):
+        return False, None
+
+    if password_hasher.check_needs_rehash(password_hash):
+        return True, hash_password(password)
+
+    return True, None
+
+
 def handle_unique_violation(error: UniqueViolation) -> None:
     if "email" in str(error):
         raise ValueError({"email": ["Email already exists"]})
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, Request, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
 
 # local imports
 from app.core.auth import get_current_user
+from app.core.responses import FastJSONResponse
+from app.db import get_unit_of_work
 from app.users.schemas import UserCreate, UserLogin, UserUpdate
 from app.users.services import UserService
 
-router = APIRouter()
+router = APIRouter(
+    dependencies=[Depends(get_unit_of_work)], default_response_class=FastJSONResponse
+)
 
 
 @router.post("/")
@@ -20,11 +22,11 @@ async def create_user_api(form_data: UserCreate):
             first_name=form_data.first_name,
             last_name=form_data.last_name,
         )
-        return JSONResponse(
-            status_code=status.HTTP_201_CREATED, content=jsonable_encoder(user)
-        )
+        return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=user)
     except ValueError as e:
-        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=e.args[0])
+        return FastJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content=e.args[0]
+        )
 
 
 @router.post("/login")
@@ -34,11 +36,9 @@ async def login(form_data: UserLogin):
             email=form_data.email,
             password=form_data.password,
         )
-        return JSONResponse(
-            status_code=status.HTTP_200_OK, content=jsonable_encoder(response)
-        )
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content=response)
     except ValueError as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST,
             content=e.args[0],
         )
@@ -46,18 +46,16 @@ async def login(form_data: UserLogin):
 
 @router.get("/me")
 async def get_me(_: Request, user=Depends(get_current_user)):
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(user))
+    return FastJSONResponse(status_code=status.HTTP_200_OK, content=user)
 
 
 @router.patch("/me")
 async def update_me(form_data: UserUpdate, user=Depends(get_current_user)):
     try:
         response = await UserService.update(form_data, user)
-        return JSONResponse(
-            status_code=status.HTTP_200_OK, content=jsonable_encoder(response)
-        )
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content=response)
     except ValueError as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST,
             content=e.args[0],
         )
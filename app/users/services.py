@@ -2,13 +2,49 @@ import uuid
 from datetime import datetime, timedelta, timezone
 
 import jwt
-from psycopg2.errors import UniqueViolation
+from psycopg.errors import UniqueViolation
 
-from app.config import JWT_ALGORITHM, JWT_SECRET_KEY
-from app.db import get_connection, release_connection
-from app.users.helpers import handle_unique_violation, hash_password, verify_password
+from app.config import JWT_ALGORITHM, JWT_SECRET_KEY, USER_CACHE_SIZE, USER_CACHE_TTL
+from app.core.cache import LRUCache
+from app.core.exceptions import EntityNotFound, ServiceUnavailable
+from app.core.mapper import RowMapper
+from app.core.statements import statements
+from app.core.string import normalize_uuid
+from app.core.versions import BLOGS, USERS, bump_versions, user_key
+from app.db import after_commit, get_connection, get_own_connection, load
+from app.users.helpers import (
+    handle_unique_violation,
+    hash_password,
+    password_executor,
+    verify_and_rehash,
+)
 from app.users.schemas import LoginResponse, User, UserUpdate
 
+USER_ROW = RowMapper(
+    User,
+    {
+        "id": "id",
+        "username": "username",
+        "created_at": "created_at",
+        "updated_at": "updated_at",
+        "email": "email",
+        "first_name": "first_name",
+        "last_name": "last_name",
+    },
+)
+
+USERS_BY_ID = statements.register(
+    "users_by_id",
+    f"""
+    SELECT {USER_ROW.columns}
+    FROM users
+    WHERE id = ANY(%s::uuid[])
+    """,
+)
+
+# users by id; entries are dropped by `UserService.update`
+user_cache: LRUCache[User] = LRUCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 
 class UserService:
     @staticmethod
@@ -18,65 +54,68 @@ class UserService:
         password: str,
         first_name: str,
         last_name: str,
-    ) -> str:
-        conn = get_connection()
+    ) -> User:
+        password_hash = await password_executor.run(hash_password, password)
+        user_id = str(uuid.uuid4())
+
         try:
-            password_hash = hash_password(password)
-            user_id = str(uuid.uuid4())
-
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO users
-                    (id, email, username, password, first_name, last_name)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        user_id,
-                        email,
-                        username,
-                        password_hash,
-                        first_name,
-                        last_name,
-                    ),
-                )
-                conn.commit()
+            async with get_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        f"""
+                        INSERT INTO users
+                        (id, email, username, password, first_name, last_name)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        RETURNING {USER_ROW.columns}
+                        """,
+                        (
+                            user_id,
+                            email,
+                            username,
+                            password_hash,
+                            first_name,
+                            last_name,
+                        ),
+                    )
+                    user = await cur.fetchone()
         except UniqueViolation as e:
-            conn.rollback()
             handle_unique_violation(e)
-        finally:
-            release_connection(conn)
 
-        return await UserService.get_by_id(user_id)
+        if user is None:
+            raise ValueError(
+                {"non_field_errors": ["Something went wrong. Please try again later"]}
+            )
+        return USER_ROW.build(user)
 
     @staticmethod
     async def get_by_id(user_id: str) -> User:
-        conn = get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT id, email, username,
-                    first_name, last_name, created_at,
-                    updated_at FROM users WHERE id = %s
-                    """,
-                    (user_id,),
-                )
-                user = cur.fetchone()
-                user = User(
-                    id=user[0],
-                    email=user[1],
-                    username=user[2],
-                    first_name=user[3],
-                    last_name=user[4],
-                    created_at=user[5].isoformat(),
-                    updated_at=user[6].isoformat(),
-                )
-        finally:
-            release_connection(conn)
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        key = normalize_uuid(user_id)
+        user = await load(UserService.get_by_ids, key) if key else None
+        if user is None:
+            raise EntityNotFound(
+                name="Users", message=f"No user can be found with id: {user_id}"
+            )
 
+        user_cache.set(user_id, user)
         return user
 
+    @staticmethod
+    async def get_by_ids(user_ids: list[str]) -> dict[str, User]:
+        """
+        The users of `user_ids` which exist, by id, read with one query. The
+        ids have to be in their canonical form (see `normalize_uuid`).
+        """
+        async with get_connection() as conn:
+            async with conn.cursor() as cur:
+                await USERS_BY_ID.execute(cur, (user_ids,))
+                users = await cur.fetchall()
+
+        return {user.id: user for user in USER_ROW.build_all(users)}
+
     @staticmethod
     async def get_by_token(token: str) -> User:
         token = token.replace("Bearer ", "")
@@ -97,51 +136,66 @@ class UserService:
 
     @staticmethod
     async def update(form_data: UserUpdate, user: User) -> User:
-        email = form_data.email if form_data.email is not None else user.email
-        username = (
-            form_data.username if form_data.username is not None else user.username
-        )
-        first_name = (
-            form_data.first_name
-            if form_data.first_name is not None
-            else user.first_name
-        )
-        last_name = (
-            form_data.last_name if form_data.last_name is not None else user.last_name
-        )
-
-        conn = get_connection()
+        """
+        Change the fields of `user` given in `form_data`, leaving the others
+        as they are in the database rather than as `user` has them, which may
+        be a cached copy.
+        """
         try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE users
-                    SET email = %s,
-                        username = %s,
-                        first_name = %s,
-                        last_name = %s
-                    WHERE id = %s
-                    """,
-                    (
-                        email,
-                        username,
-                        first_name,
-                        last_name,
-                        user.id,
-                    ),
-                )
-                conn.commit()
+            async with get_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        f"""
+                        UPDATE users
+                        SET email = COALESCE(%s, email),
+                            username = COALESCE(%s, username),
+                            first_name = COALESCE(%s, first_name),
+                            last_name = COALESCE(%s, last_name)
+                        FROM (
+                            SELECT username AS old_username
+                            FROM users
+                            WHERE id = %s
+                            FOR UPDATE
+                        ) old
+                        WHERE id = %s
+                        RETURNING {USER_ROW.columns}, username <> old_username
+                        """,
+                        (
+                            form_data.email,
+                            form_data.username,
+                            form_data.first_name,
+                            form_data.last_name,
+                            user.id,
+                            user.id,
+                        ),
+                    )
+                    row = await cur.fetchone()
+                    if row is None:
+                        raise EntityNotFound(
+                            name="Users",
+                            message=f"No user can be found with id: {user.id}",
+                        )
+                    # the username is all listings and comment trees show of
+                    # the fields here, so only a rename changes them
+                    keys = [user_key(user.id)]
+                    if row[-1]:
+                        keys += [BLOGS, USERS]
+                    await bump_versions(cur, keys)
+                    # not before, or a concurrent read could cache the old
+                    # user again until the transaction commits
+                    after_commit(lambda: user_cache.invalidate(user.id))
+
+            return USER_ROW.build(row[:-1])
 
-            return await UserService.get_by_id(user.id)
+        except EntityNotFound:
+            raise
 
         except ValueError as e:
             print(e)
-            conn.rollback()
             raise e
 
         except Exception as e:
             print(e)
-            conn.rollback()
             raise ValueError(
                 {
                     "non_field_errors": [
@@ -149,33 +203,48 @@ class UserService:
                     ]
                 }
             ) from e
-        finally:
-            release_connection(conn)
 
     @staticmethod
     async def authenticate(email: str, password: str) -> LoginResponse:
-        conn = get_connection()
         try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT id, password
-                    FROM users
-                    WHERE email = %s
-                    """,
-                    (email,),
+            # not on the connection of the unit of work, which would stay
+            # checked out of the pool while the password is hashed
+            async with get_own_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        f"""
+                        SELECT {USER_ROW.columns}, password
+                        FROM users
+                        WHERE email = %s
+                        """,
+                        (email,),
+                    )
+                    row = await cur.fetchone()
+
+            is_valid, new_password_hash = (
+                await password_executor.run(
+                    verify_and_rehash, password, row[len(USER_ROW)]
+                )
+                if row
+                else (False, None)
+            )
+            if row is None or not is_valid:
+                raise ValueError(
+                    {
+                        "non_field_errors": [
+                            "Invalid email or password",
+                        ]
+                    }
                 )
-                user = cur.fetchone()
-                if not user or not verify_password(password, user[1]):
-                    raise ValueError(
-                        {
-                            "non_field_errors": [
-                                "Invalid email or password",
-                            ]
-                        }
+
+            if new_password_hash is not None:
+                async with get_connection() as conn:
+                    await conn.execute(
+                        "UPDATE users SET password = %s WHERE id = %s",
+                        (new_password_hash, row[0]),
                     )
 
-            user = await UserService.get_by_id(user[0])
+            user = USER_ROW.build(row)
 
             token_expiration = int(
                 (datetime.now(timezone.utc) + timedelta(days=1)).timestamp()
@@ -192,7 +261,7 @@ class UserService:
 
             return LoginResponse(token=token, user=user)
 
-        except ValueError as e:
+        except (ValueError, ServiceUnavailable) as e:
             raise e
 
         except Exception as e:
@@ -204,8 +273,6 @@ class UserService:
                     ]
                 }
             ) from e
-        finally:
-            release_connection(conn)
 
     @staticmethod
     def serializer_user(user: User) -> dict:
@@ -0,0 +1,114 @@
+"""
+Per request overhead of the auth middleware.
+
+Compares the previous BaseHTTPMiddleware based implementation with the pure
+ASGI `AuthMiddleware` on a public route, driving the ASGI app directly so
+that no server, socket or database is involved.
+
+    python -m benchmarks.auth_middleware
+"""
+
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+# local imports
+from app.core.auth import get_request_user
+from app.core.middleware.auth_middleware import AuthMiddleware
+
+REQUESTS = 20_000
+
+
+class BaseHTTPAuthMiddleware(BaseHTTPMiddleware):
+    """
+    The BaseHTTPMiddleware implementation AuthMiddleware replaced.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        try:
+            await get_request_user(request)
+        except ValueError as e:
+            return JSONResponse(status_code=401, content=e.args[0])
+
+        return await call_next(request)
+
+
+def build_app(middleware=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    """
+    Mean seconds per request.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("localhost", 80),
+    }
+
+    def make_receive():
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # like a server with the client still connected
+            await asyncio.Event().wait()
+
+        return receive
+
+    async def send(_):
+        pass
+
+    for _ in range(requests // 10):
+        await app(dict(scope), make_receive(), send)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), make_receive(), send)
+    return (time.perf_counter() - started) / requests
+
+
+async def main() -> None:
+    baseline = await measure(build_app(), REQUESTS)
+    results = {
+        "no middleware": baseline,
+        "BaseHTTPMiddleware (before)": await measure(
+            build_app(BaseHTTPAuthMiddleware), REQUESTS
+        ),
+        "ASGI AuthMiddleware (after)": await measure(
+            build_app(AuthMiddleware), REQUESTS
+        ),
+    }
+
+    for name, seconds in results.items():
+        overhead = (seconds - baseline) * 1e6
+        print(f"{name:<30} {seconds * 1e6:8.1f} us/request  (+{overhead:.1f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Cost of the autocomplete index of blog titles with a million blogs.
+
+Measures rebuilding it from scratch, the memory it reports, answering
+prefixes of one to a few characters, and keeping it up to date as blogs
+are created and deleted.
+
+    python -m benchmarks.prefix_index
+"""
+
+import asyncio
+import random
+import string
+import time
+import uuid
+
+# local imports
+from app.core.prefix_index import PrefixIndex
+from app.core.string import slugify
+
+BLOGS = 1_000_000
+WORDS = 20_000
+ROUNDS = 1_000
+
+
+def make_blogs(count: int) -> list[tuple[str, tuple[str, str, str], float]]:
+    words = [
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+        for _ in range(WORDS)
+    ]
+    blogs = []
+    for i in range(count):
+        blog_id = str(uuid.uuid4())
+        title = " ".join(random.choices(words, k=random.randint(2, 7))).title()
+        slug = (
+            slugify(title) + "-" + "".join(random.choices(string.ascii_lowercase, k=6))
+        )
+        blogs.append((blog_id, (blog_id, title, slug), float(i)))
+    return blogs
+
+
+def per_call(func, args: list) -> float:
+    """
+    Mean microseconds per call.
+    """
+    started = time.perf_counter()
+    for arg in args:
+        func(*arg)
+    return (time.perf_counter() - started) / len(args) * 1e6
+
+
+async def main() -> None:
+    blogs = make_blogs(BLOGS)
+    index: PrefixIndex[tuple[str, str, str]] = PrefixIndex(
+        texts=lambda blog: blog[1:], cache_size=0
+    )
+
+    async def load():
+        return blogs
+
+    await index.rebuild(load)
+    stats = index.stats()
+    print(f"{BLOGS} blogs, {stats['keys']} keys")
+    print(f"  rebuild          {index.build_seconds:8.2f} s")
+    print(f"  memory           {stats['bytes'] / 2**20:8.0f} MiB")
+
+    titles = [value[1].casefold() for _, value, _ in random.sample(blogs, ROUNDS)]
+    for length in (1, 2, 4):
+        prefixes = [(title[:length], 10) for title in titles]
+        print(f"  search {length} chars   {per_call(index.search, prefixes):8.1f} us")
+
+    created = make_blogs(ROUNDS)
+    print(f"  set              {per_call(index.set, created):8.1f} us")
+    removed = [(blog_id,) for blog_id, _, _ in created]
+    print(f"  remove           {per_call(index.remove, removed):8.1f} us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+Cost of building the models of a 1,000 row blog listing from cursor rows.
+
+Compares validating every row into `Blog` and `Author` models, as the
+services used to, with `RowMapper`, which builds the author of several
+blogs once, on rows by a few authors and on rows by as many authors as
+blogs.
+
+    python -m benchmarks.row_mapping
+"""
+
+import statistics
+import time
+import uuid
+from datetime import datetime
+from typing import Callable
+
+# local imports
+from app.blogs.schemas import Author, Blog
+from app.blogs.services import BLOG_ROW
+
+ROWS = 1_000
+ROUNDS = 50
+NOW = datetime(2024, 1, 1)
+
+
+def make_rows(count: int, authors: int) -> list[tuple]:
+    author_ids = [str(uuid.uuid4()) for _ in range(authors)]
+    rows = []
+    for i in range(count):
+        author_id = author_ids[i % authors]
+        rows.append(
+            (
+                str(uuid.uuid4()),
+                f"Blog {i}",
+                f"blog-{i}",
+                "lorem ipsum dolor sit amet " * 40,
+                NOW,
+                NOW,
+                i,
+                author_id,
+                author_id,
+                f"author-{author_id}",
+                NOW,
+                NOW,
+                count // authors,
+                100,
+            )
+        )
+    return rows
+
+
+def validated(rows: list[tuple]) -> list[Blog]:
+    """
+    The services before RowMapper.
+    """
+    return [
+        Blog(
+            id=row[0],
+            title=row[1],
+            slug=row[2],
+            content=row[3],
+            created_at=row[4],
+            updated_at=row[5],
+            comment_count=row[6],
+            author_id=row[7],
+            author=Author(
+                id=row[8],
+                username=row[9],
+                created_at=row[10],
+                updated_at=row[11],
+                blog_count=row[12],
+                comment_count=row[13],
+            ),
+        )
+        for row in rows
+    ]
+
+
+def measure(build: Callable[[list[tuple]], list], rows: list[tuple]) -> float:
+    """
+    Median seconds per listing, which the collections of the garbage
+    collector, landing on some rounds and not others, shift less than the
+    mean.
+    """
+    build(rows)
+
+    times = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        build(rows)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main() -> None:
+    builders = {
+        "validated (before)": validated,
+        "RowMapper (after)": BLOG_ROW.build_all,
+    }
+
+    for authors in (20, ROWS):
+        rows = make_rows(ROWS, authors)
+        print(f"{ROWS} blogs by {authors} authors")
+        for name, build in builders.items():
+            seconds = measure(build, rows)
+            print(f"  {name:<28} {seconds * 1e3:8.2f} ms/listing")
+
+
+if __name__ == "__main__":
+    main()
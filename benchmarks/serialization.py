@@ -0,0 +1,123 @@
+"""
+Cost of turning a response model into JSON bytes.
+
+Compares what FastAPI does with a returned model (`jsonable_encoder` and then
+`JSONResponse` on top of the json module) with `FastJSONResponse`, on a page
+of blogs and on a comment tree, without a database.
+
+    python -m benchmarks.serialization
+"""
+
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# local imports
+from app.blogs.schemas import Author, Blog, PaginatedBlogsResponse
+from app.comments.schemas import Comment
+from app.core.responses import FastJSONResponse
+from app.users.schemas import UserPublic
+
+ROUNDS = 2_000
+NOW = datetime(2024, 1, 1)
+
+
+def blogs_page(size: int = 20) -> PaginatedBlogsResponse:
+    author = Author(
+        id=str(uuid.uuid4()),
+        username="author",
+        created_at=NOW,
+        updated_at=NOW,
+        blog_count=size,
+        comment_count=100,
+    )
+    return PaginatedBlogsResponse(
+        count=1_000,
+        next="/api/blogs/?skip=1&limit=20",
+        previous=None,
+        results=[
+            Blog(
+                id=str(uuid.uuid4()),
+                title=f"Blog {i}",
+                slug=f"blog-{i}",
+                content="lorem ipsum dolor sit amet " * 40,
+                created_at=NOW - timedelta(hours=i),
+                updated_at=NOW,
+                comment_count=i,
+                author_id=author.id,
+                author=author,
+            )
+            for i in range(size)
+        ],
+    )
+
+
+def comment_tree(width: int = 6, depth: int = 3) -> list[Comment]:
+    actor = UserPublic(
+        id=str(uuid.uuid4()), username="actor", created_at=NOW, updated_at=NOW
+    )
+    blog_id = str(uuid.uuid4())
+
+    def build(level: int, parent_id: Any) -> list[Comment]:
+        if level == depth:
+            return []
+
+        comments = []
+        for i in range(width):
+            comment_id = str(uuid.uuid4())
+            comments.append(
+                Comment(
+                    id=comment_id,
+                    content=f"comment {level}.{i} " * 10,
+                    actor_id=actor.id,
+                    blog_id=blog_id,
+                    parent_id=parent_id,
+                    created_at=NOW,
+                    updated_at=NOW,
+                    actor=actor,
+                    children=build(level + 1, comment_id),
+                )
+            )
+        return comments
+
+    return build(0, None)
+
+
+def measure(render: Callable[[Any], bytes], content: Any, rounds: int) -> float:
+    """
+    Mean seconds per response.
+    """
+    for _ in range(rounds // 10):
+        render(content)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        render(content)
+    return (time.perf_counter() - started) / rounds
+
+
+def main() -> None:
+    renderers = {
+        "jsonable_encoder + JSONResponse (before)": lambda content: JSONResponse(
+            jsonable_encoder(content)
+        ).body,
+        "FastJSONResponse (after)": lambda content: FastJSONResponse(content).body,
+    }
+    payloads = {
+        "blog page (20 blogs)": blogs_page(),
+        "comment tree (258 comments)": comment_tree(),
+    }
+
+    for payload_name, content in payloads.items():
+        print(payload_name)
+        for name, render in renderers.items():
+            seconds = measure(render, content, ROUNDS)
+            print(f"  {name:<42} {seconds * 1e6:8.1f} us/response")
+
+
+if __name__ == "__main__":
+    main()